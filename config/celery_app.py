@@ -3,8 +3,7 @@ import os
 from celery import Celery
 from celery.schedules import crontab
 from celery.signals import setup_logging
-
-from .tasks import cleanup_clocked_schedules
+from django.conf import settings
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
@@ -31,10 +30,78 @@ def config_loggers(*args, **kwargs):
 app.autodiscover_tasks()
 
 
+def maintenance_signature(sender: Celery, name: str):
+    """Returns the signature of a maintenance task, partitioned if configured."""
+    if settings.MAINTENANCE_PARTITIONS > 1:
+        return sender.signature("run_partitioned", args=[name])
+    return sender.signature(name)
+
+
 @app.on_after_finalize.connect
 def setup_periodic_tasks(sender: Celery, **kwargs):
     sender.add_periodic_task(
         crontab(minute=0, hour="0,12"),
-        cleanup_clocked_schedules.s(),
+        maintenance_signature(sender, "cleanup_clocked_schedules"),
         name="Cleanup Clocked Schedules",
     )
+    sender.add_periodic_task(
+        settings.EXPIRY_WHEEL_INTERVAL,
+        sender.signature("dispatch_expirations"),
+        name="Dispatch Expirations",
+    )
+    sender.add_periodic_task(
+        settings.EMAIL_QUEUE_INTERVAL,
+        sender.signature("send_queued_emails"),
+        name="Send Queued Emails",
+    )
+    # Fallback for the outboxrelay service, which relays continuously.
+    sender.add_periodic_task(
+        crontab(),
+        sender.signature("relay_outbox"),
+        name="Relay Outbox",
+    )
+    sender.add_periodic_task(
+        crontab(),
+        maintenance_signature(sender, "delete_expired_links"),
+        name="Delete Expired Links",
+    )
+    sender.add_periodic_task(
+        crontab(minute=45),
+        maintenance_signature(sender, "cleanup_expired_tokens"),
+        name="Cleanup Expired Tokens",
+    )
+    sender.add_periodic_task(
+        crontab(minute=30, hour=3),
+        sender.signature("rebuild_link_filter"),
+        name="Rebuild Link Filter",
+    )
+    sender.add_periodic_task(
+        crontab(),
+        sender.signature("flush_link_clicks"),
+        name="Flush Link Clicks",
+    )
+    sender.add_periodic_task(
+        crontab(minute="*/5"),
+        sender.signature("compact_link_clicks"),
+        name="Compact Link Clicks",
+    )
+    sender.add_periodic_task(
+        crontab(minute=15),
+        sender.signature("rollup_link_clicks"),
+        name="Rollup Link Clicks",
+    )
+    sender.add_periodic_task(
+        crontab(minute="*/5"),
+        sender.signature("persist_link_unique_visitors"),
+        name="Persist Link Unique Visitors",
+    )
+    sender.add_periodic_task(
+        crontab(),
+        sender.signature("refill_link_shortcode_pool"),
+        name="Refill Link Shortcode Pool",
+    )
+    sender.add_periodic_task(
+        crontab(),
+        sender.signature("record_queue_depths"),
+        name="Record Queue Depths",
+    )
@@ -48,6 +48,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ROOT_URLCONF = "config.urls"
 # https://docs.djangoproject.com/en/dev/ref/settings/#wsgi-application
 WSGI_APPLICATION = "config.wsgi.application"
+# Serve the redirect and read-only link views asynchronously. Only enable it
+# when running under ASGI (see compose/production/django/start).
+ASYNC_VIEWS = config("DJANGO_ASYNC_VIEWS", default=False, cast=bool)
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -70,6 +73,7 @@ LOCAL_APPS = [
     "sbily.users",
     "sbily.authentication",
     "sbily.notifications",
+    "sbily.outbox",
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -82,6 +86,9 @@ AUTH_USER_MODEL = "users.User"
 LOGIN_REDIRECT_URL = "my_account"
 # https://docs.djangoproject.com/en/dev/ref/settings/#login-url
 LOGIN_URL = "sign_in"
+# Issue signed email verification, password reset, change email and sign in
+# with email tokens instead of storing them in the database.
+STATELESS_TOKENS = config("STATELESS_TOKENS", default=True, cast=bool)
 
 # PASSWORDS
 # ------------------------------------------------------------------------------
@@ -107,7 +114,9 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "sbily.utils.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "sbily.links.middleware.RedirectFastPathMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -179,6 +188,23 @@ EMAIL_BACKEND = config(
 )
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-timeout
 EMAIL_TIMEOUT = 5
+# Emails are queued in Redis and sent in batches over one connection.
+EMAIL_QUEUE_INTERVAL = config("EMAIL_QUEUE_INTERVAL", default=5.0, cast=float)
+EMAIL_QUEUE_BATCH_SIZE = config("EMAIL_QUEUE_BATCH_SIZE", default=100, cast=int)
+# Seconds, below CELERY_TASK_SOFT_TIME_LIMIT
+EMAIL_QUEUE_TIME_BUDGET = config("EMAIL_QUEUE_TIME_BUDGET", default=45, cast=int)
+EMAIL_MAX_ATTEMPTS = config("EMAIL_MAX_ATTEMPTS", default=5, cast=int)
+# Seconds during which repeated requests for the same email to a user (e.g.
+# a verification or password reset link) only send it once.
+EMAIL_IDEMPOTENCY_WINDOW = config("EMAIL_IDEMPOTENCY_WINDOW", default=60, cast=int)
+# Maximum rate each worker runs user-triggered email tasks at.
+EMAIL_TASK_RATE_LIMIT = config("EMAIL_TASK_RATE_LIMIT", default="20/s")
+
+# METRICS
+# ------------------------------------------------------------------------------
+# Bearer token required to read the Prometheus metrics at /metrics. Without
+# one, the endpoint is only served when DEBUG is on.
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
 
 # ADMIN
 # ------------------------------------------------------------------------------
@@ -215,6 +241,66 @@ LOGGING = {
 REDIS_URL = config("REDIS_URL", default="redis://redis:6379/0")
 REDIS_SSL = REDIS_URL.startswith("rediss://")
 
+# Links
+# ------------------------------------------------------------------------------
+# How long (in seconds) a shortened link resolution is kept in the cache.
+LINK_CACHE_TIMEOUT = config("LINK_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+# Maximum number of link resolutions kept in each process (0 disables it).
+LINK_LOCAL_CACHE_MAX_SIZE = config(
+    "LINK_LOCAL_CACHE_MAX_SIZE",
+    default=10_000,
+    cast=int,
+)
+# How long (in seconds) a process keeps a link resolution. This bounds how
+# stale it can get if an invalidation broadcast is missed.
+LINK_LOCAL_CACHE_TIMEOUT = config("LINK_LOCAL_CACHE_TIMEOUT", default=30, cast=int)
+# Expected number of shortened links and target false positive rate of the
+# Bloom filter used to reject unknown shortened links.
+LINK_FILTER_CAPACITY = config("LINK_FILTER_CAPACITY", default=1_000_000, cast=int)
+LINK_FILTER_ERROR_RATE = config("LINK_FILTER_ERROR_RATE", default=0.01, cast=float)
+# Number of links updated per statement when flushing buffered clicks.
+CLICK_FLUSH_BATCH_SIZE = config("CLICK_FLUSH_BATCH_SIZE", default=1000, cast=int)
+HOURLY_CLICKS_RETENTION_DAYS = config(
+    "HOURLY_CLICKS_RETENTION_DAYS",
+    default=7,
+    cast=int,
+)
+DAILY_CLICKS_ROLLUP_DAYS = config("DAILY_CLICKS_ROLLUP_DAYS", default=2, cast=int)
+# Number of reverse proxies in front of Django that append to X-Forwarded-For.
+# Visitors are identified by the address the outermost of them appended; with
+# none, by REMOTE_ADDR.
+TRUSTED_PROXY_COUNT = config("TRUSTED_PROXY_COUNT", default=0, cast=int)
+NOTIFICATION_BATCH_SIZE = config("NOTIFICATION_BATCH_SIZE", default=500, cast=int)
+NOTIFICATION_MAX_LISTED_LINKS = config(
+    "NOTIFICATION_MAX_LISTED_LINKS",
+    default=20,
+    cast=int,
+)
+EXPIRY_WHEEL_INTERVAL = config("EXPIRY_WHEEL_INTERVAL", default=5.0, cast=float)
+EXPIRY_WHEEL_BATCH_SIZE = config("EXPIRY_WHEEL_BATCH_SIZE", default=500, cast=int)
+EXPIRED_LINKS_BATCH_SIZE = config("EXPIRED_LINKS_BATCH_SIZE", default=500, cast=int)
+# Seconds, below CELERY_TASK_SOFT_TIME_LIMIT
+EXPIRED_LINKS_TIME_BUDGET = config("EXPIRED_LINKS_TIME_BUDGET", default=45, cast=int)
+# Maintenance tasks are split into this many primary key ranges run in
+# parallel as a Celery chord; 1 runs them as a single task.
+MAINTENANCE_PARTITIONS = config("MAINTENANCE_PARTITIONS", default=1, cast=int)
+SHORTCODE_ALLOCATOR = config("SHORTCODE_ALLOCATOR", default="pool")
+SHORTCODE_POOL_SIZE = config("SHORTCODE_POOL_SIZE", default=10_000, cast=int)
+SHORTCODE_POOL_BATCH_SIZE = config("SHORTCODE_POOL_BATCH_SIZE", default=1000, cast=int)
+SHORTCODE_SEQUENCE_BLOCK_SIZE = config(
+    "SHORTCODE_SEQUENCE_BLOCK_SIZE",
+    default=100,
+    cast=int,
+)
+SHORTCODE_MIN_LENGTH = config("SHORTCODE_MIN_LENGTH", default=6, cast=int)
+SHORTCODE_SEQUENCE_SALT = config("SHORTCODE_SEQUENCE_SALT", default="")
+
+# Outbox
+# ------------------------------------------------------------------------------
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=100, cast=int)
+# Seconds, below CELERY_TASK_SOFT_TIME_LIMIT
+OUTBOX_RELAY_TIME_BUDGET = config("OUTBOX_RELAY_TIME_BUDGET", default=45, cast=int)
+
 # Django messages
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#std:setting-MESSAGE_STORAGE
@@ -268,6 +354,22 @@ CELERY_WORKER_SEND_TASK_EVENTS = True
 CELERY_TASK_SEND_SENT_EVENT = True
 # https://docs.celeryq.dev/en/latest/userguide/configuration.html#worker-hijack-root-logger
 CELERY_WORKER_HIJACK_ROOT_LOGGER = False
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#imports
+# config is not an installed app, so autodiscover_tasks() skips its tasks.
+CELERY_IMPORTS = ("config.tasks",)
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_default_queue
+CELERY_TASK_DEFAULT_QUEUE = "bulk"
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_routes
+# Each task's queue and priority are declared with default_task_params.
+CELERY_TASK_ROUTES = ("sbily.utils.tasks.route_task",)
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_default_priority
+CELERY_TASK_DEFAULT_PRIORITY = 5
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#broker-transport-options
+# Workers consuming several queues (-Q interactive,bulk) drain them in order.
+CELERY_BROKER_TRANSPORT_OPTIONS = {"queue_order_strategy": "priority"}
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-prefetch-multiplier
+# Reserve one message per process at a time, so priorities take effect.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-concurrency
 CELERY_WORKER_CONCURRENCY = config("CELERY_WORKER_CONCURRENCY", default=2, cast=int)
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-max-tasks-per-child
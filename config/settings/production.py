@@ -41,11 +41,15 @@ CACHES = {
         },
     },
 }
+# https://github.com/jazzband/django-redis#log-ignored-exceptions
+DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
 
 # SECURITY
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#secure-proxy-ssl-header
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+# Traefik appends the client address to X-Forwarded-For.
+TRUSTED_PROXY_COUNT = config("TRUSTED_PROXY_COUNT", default=1, cast=int)
 # https://docs.djangoproject.com/en/dev/ref/settings/#secure-ssl-redirect
 SECURE_SSL_REDIRECT = config("DJANGO_SECURE_SSL_REDIRECT", cast=bool, default=True)
 # https://docs.djangoproject.com/en/dev/ref/settings/#session-cookie-secure
@@ -124,6 +128,11 @@ EMAIL_SUBJECT_PREFIX = config(
 # Django Admin URL regex.
 ADMIN_URL = config("DJANGO_ADMIN_URL")
 
+# METRICS
+# ------------------------------------------------------------------------------
+# Required, so the Prometheus metrics at /metrics are never public.
+METRICS_TOKEN = config("METRICS_TOKEN")
+
 # Anymail
 # ------------------------------------------------------------------------------
 # https://anymail.readthedocs.io/en/stable/installation/#installing-anymail
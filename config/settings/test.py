@@ -13,6 +13,21 @@ SECRET_KEY = config("DJANGO_SECRET_KEY", default="k*zpSb*jMcXatzx!hfmepS^k@^^@9$
 # https://docs.djangoproject.com/en/dev/ref/settings/#test-runner
 TEST_RUNNER = "django.test.runner.DiscoverRunner"
 
+# URLS
+BASE_URL = config("BASE_URL", default="http://localhost:8000/")
+LINK_PREFIX = config("LINK_PREFIX", default="l/")
+LINK_BASE_URL = BASE_URL + LINK_PREFIX
+
+# CACHES
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#caches
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "",
+    },
+}
+
 # PASSWORDS
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#password-hashers
@@ -1,37 +1,163 @@
+import time
+
+from celery import chord
+from celery import current_app
 from celery import shared_task
-from django.utils.timezone import now
-from django.utils.timezone import timedelta
+from celery.utils.log import get_task_logger
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Max
+from django.db.models import Min
 
+from sbily.utils.tasks import PRIORITY_HIGH
+from sbily.utils.tasks import PRIORITY_LOW
+from sbily.utils.tasks import QUEUE_INTERACTIVE
 from sbily.utils.tasks import default_task_params
+from sbily.utils.tasks import get_queue_depths
+from sbily.utils.tasks import merge_task_responses
+from sbily.utils.tasks import split_pk_range
 from sbily.utils.tasks import task_response
 
+logger = get_task_logger(__name__)
+
+# Task deleting the objects of each kind scheduled in the expiry wheel, called
+# with a list of IDs.
+EXPIRATION_TASKS = {
+    "link": "delete_links_by_ids",
+    "token": "delete_tokens_by_ids",
+}
+# Maintenance tasks accepting a ``pk_range`` argument, with the model whose
+# primary keys they are partitioned by.
+PARTITIONED_TASKS = {
+    "delete_expired_links": "links.ShortenedLink",
+    "delete_excess_user_links": "users.User",
+    "cleanup_expired_tokens": "users.Token",
+    "cleanup_clocked_schedules": "django_celery_beat.ClockedSchedule",
+}
 
-@shared_task(**default_task_params("cleanup_clocked_schedules", acks_late=True))
-def cleanup_clocked_schedules(self):
+
+@shared_task(
+    **default_task_params(
+        "cleanup_clocked_schedules",
+        priority=PRIORITY_LOW,
+        acks_late=True,
+    ),
+)
+def cleanup_clocked_schedules(self, pk_range: list[int] | None = None):
     """
     Clean up expired clocked schedules that are not associated with any periodic tasks.
-    Also removes disabled periodic tasks containing 'Remove link' and
-    'Delete token' in their name.
+
+    Args:
+        pk_range: Only clean up schedules with primary keys in this inclusive range.
     """
     from django_celery_beat.models import ClockedSchedule
-    from django_celery_beat.models import PeriodicTask
 
-    periodic_tasks = PeriodicTask.objects.filter(
-        enabled=False,
-        name__regex=r"^(Remove link|Delete token)",
+    schedules = ClockedSchedule.objects.filter(periodictask__isnull=True)
+    if pk_range is not None:
+        schedules = schedules.filter(pk__range=pk_range)
+    schedule_deleted = schedules.delete()[0]
+
+    return task_response(
+        "COMPLETED",
+        f"Cleaned up {schedule_deleted} expired clocked schedules",
+        deleted_count=schedule_deleted,
     )
 
-    threshold_time = now() + timedelta(minutes=5)
-    periodic_tasks.filter(clocked__clocked_time__gte=threshold_time).update(
-        enabled=True,
+
+@shared_task(**default_task_params("run_partitioned", acks_late=True))
+def run_partitioned(self, task_name: str, partitions: int | None = None) -> dict:
+    """Run a maintenance task as a chord of primary key range partitions.
+
+    The primary keys of the task's model are split into ``partitions``
+    (``MAINTENANCE_PARTITIONS`` by default) ranges, each run as a subtask on
+    any worker. ``aggregate_task_responses`` combines their responses.
+
+    Args:
+        task_name: Name of a task in ``PARTITIONED_TASKS``.
+        partitions: Number of partitions.
+    """
+    partitions = partitions or getattr(settings, "MAINTENANCE_PARTITIONS", 1)
+    model = apps.get_model(PARTITIONED_TASKS[task_name])
+    bounds = model.objects.aggregate(first=Min("pk"), last=Max("pk"))
+    pk_ranges = split_pk_range(bounds["first"], bounds["last"], partitions)
+    if not pk_ranges:
+        return task_response(
+            "COMPLETED",
+            f"Nothing to partition for {task_name}.",
+            partition_count=0,
+        )
+
+    chord(
+        current_app.signature(task_name, kwargs={"pk_range": list(pk_range)})
+        for pk_range in pk_ranges
+    )(aggregate_task_responses.s(task_name))
+    return task_response(
+        "COMPLETED",
+        f"Split {task_name} into {len(pk_ranges)} partitions.",
+        partition_count=len(pk_ranges),
     )
 
-    periodic_deleted = periodic_tasks.delete()[0]
-    schedule_deleted = ClockedSchedule.objects.filter(
-        periodictask__isnull=True,
-    ).delete()[0]
 
+@shared_task(**default_task_params("aggregate_task_responses"))
+def aggregate_task_responses(self, responses: list[dict], task_name: str) -> dict:
+    """Combine the responses of the partitions of a maintenance task."""
+    return merge_task_responses(f"Ran {task_name} in partitions.", responses)
+
+
+@shared_task(
+    **default_task_params(
+        "dispatch_expirations",
+        priority=PRIORITY_HIGH,
+        acks_late=True,
+    ),
+)
+def dispatch_expirations(self) -> dict:
+    """Dispatch the expirations due in the expiry wheel.
+
+    Due entries are popped in batches and each kind is sent as one task with
+    the list of IDs. Entries are put back if sending fails.
+    """
+    from sbily.utils.expiry import get_expiry_wheel
+
+    batch_size = getattr(settings, "EXPIRY_WHEEL_BATCH_SIZE", 500)
+    wheel = get_expiry_wheel()
+    dispatched_count = 0
+    while due := wheel.pop_due(time.time(), batch_size):
+        for kind, entries in due.items():
+            try:
+                current_app.send_task(
+                    EXPIRATION_TASKS[kind],
+                    args=[[object_id for object_id, _ in entries]],
+                )
+            except Exception:
+                wheel.restore(kind, entries)
+                raise
+            dispatched_count += len(entries)
+
+    return task_response(
+        "COMPLETED",
+        f"Dispatched {dispatched_count} expirations.",
+        dispatched_count=dispatched_count,
+    )
+
+
+@shared_task(
+    **default_task_params(
+        "record_queue_depths",
+        queue=QUEUE_INTERACTIVE,
+        priority=PRIORITY_HIGH,
+    ),
+)
+def record_queue_depths(self) -> dict:
+    """Log the number of messages waiting in each task queue.
+
+    Runs on the interactive queue, so a bulk backlog is still reported.
+    """
+    depths = get_queue_depths()
+    for queue, depth in depths.items():
+        logger.info("Task queue %s has %s waiting messages", queue, depth)
     return task_response(
         "COMPLETED",
-        f"Cleaned up {schedule_deleted} expired clocked schedules and {periodic_deleted} disabled periodic tasks",  # noqa: E501
+        f"Recorded the depth of {len(depths)} task queues.",
+        **depths,
     )
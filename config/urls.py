@@ -5,12 +5,15 @@ from django.urls import include
 from django.urls import path
 from django.views import defaults as default_views
 
+from sbily.utils.metrics import metrics
+
 urlpatterns = [
     path(settings.ADMIN_URL, admin.site.urls),
     path("", include("sbily.links.urls")),
     path("auth/", include("sbily.authentication.urls")),
     path("account/", include("sbily.users.urls")),
     path("notifications/", include("sbily.notifications.urls")),
+    path("metrics", metrics, name="metrics"),
     # Media files
     *static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT),
 ]
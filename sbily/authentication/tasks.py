@@ -1,14 +1,36 @@
 from celery import shared_task
+from django.conf import settings
 
 from sbily.users.models import Token
 from sbily.users.models import User
+from sbily.utils.tasks import PRIORITY_HIGH
+from sbily.utils.tasks import QUEUE_INTERACTIVE
 from sbily.utils.tasks import default_task_params
+from sbily.utils.tasks import suppress_duplicate_run
 from sbily.utils.tasks import task_response
 
+EMAIL_IDEMPOTENCY_WINDOW = getattr(settings, "EMAIL_IDEMPOTENCY_WINDOW", 60)
+EMAIL_TASK_RATE_LIMIT = getattr(settings, "EMAIL_TASK_RATE_LIMIT", "20/s")
 
-@shared_task(**default_task_params("send_sign_in_with_email"))
+
+@shared_task(
+    **default_task_params(
+        "send_sign_in_with_email",
+        queue=QUEUE_INTERACTIVE,
+        priority=PRIORITY_HIGH,
+        rate_limit=EMAIL_TASK_RATE_LIMIT,
+        idempotency_window=EMAIL_IDEMPOTENCY_WINDOW,
+    ),
+)
 def send_sign_in_with_email(self, user_id: int):
     """Send sign in with email link to user."""
+    if response := suppress_duplicate_run(
+        self,
+        user_id,
+        window=EMAIL_IDEMPOTENCY_WINDOW,
+    ):
+        return response
+
     user = User.objects.get(id=user_id)
 
     subject = "Sign in to your account"
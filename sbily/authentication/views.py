@@ -7,10 +7,12 @@ from django.shortcuts import redirect
 from django.shortcuts import render
 
 from sbily.links.models import ShortenedLink
+from sbily.outbox.utils import enqueue_task
 from sbily.users.models import Token
 from sbily.users.tasks import send_password_changed_email
 from sbily.users.tasks import send_password_reset_email
 from sbily.users.tasks import send_welcome_email
+from sbily.users.utils.tokens import get_user_token
 from sbily.utils.errors import BadRequestError
 from sbily.utils.errors import bad_request_error
 from sbily.utils.urls import reverse_with_params
@@ -39,7 +41,7 @@ def sign_up(request: HttpRequest):
                 "User created successfully! Please verify your email",
             )
             login(request, user)
-            send_welcome_email.delay_on_commit(user.id)
+            enqueue_task(send_welcome_email, user.id)
             return redirect("my_account")
         except Exception as e:
             messages.error(request, f"Error signing up: {e}")
@@ -95,7 +97,7 @@ def sign_in_with_email(request: HttpRequest):
         try:
             user = form.cleaned_data.get("user")
 
-            send_sign_in_with_email.delay_on_commit(user.id)
+            enqueue_task(send_sign_in_with_email, user.id)
             messages.success(
                 request,
                 "Please check your email for a sign in link.",
@@ -113,7 +115,7 @@ def sign_in_with_email_verify(request: HttpRequest, token: str):
         return redirect("my_account")
 
     try:
-        token = Token.objects.get(token=token, type=Token.TYPE_SIGN_IN_WITH_EMAIL)
+        token = get_user_token(token, Token.TYPE_SIGN_IN_WITH_EMAIL)
 
         if token.is_expired():
             bad_request_error("Token has expired! Please request a new one")
@@ -150,7 +152,7 @@ def verify_email(request: HttpRequest, token: str):
     )
 
     try:
-        obj_token = Token.objects.get(token=token, type="email_verification")
+        obj_token = get_user_token(token, Token.TYPE_EMAIL_VERIFICATION)
 
         if is_authenticated and user != obj_token.user:
             bad_request_error("Invalid token")
@@ -185,7 +187,7 @@ def forgot_password(request: HttpRequest):
     if form.is_valid():
         try:
             user = form.cleaned_data.get("user")
-            send_password_reset_email.delay_on_commit(user.id)
+            enqueue_task(send_password_reset_email, user.id)
             messages.success(request, "Password reset email sent successfully")
             return redirect("sign_in")
         except Exception as e:
@@ -197,7 +199,7 @@ def forgot_password(request: HttpRequest):
 
 def reset_password(request: HttpRequest, token: str):
     try:
-        obj_token = Token.objects.get(token=token, type=Token.TYPE_PASSWORD_RESET)
+        obj_token = get_user_token(token, Token.TYPE_PASSWORD_RESET)
     except Token.DoesNotExist:
         messages.error(request, "Invalid token")
         return redirect("forgot_password")
@@ -216,7 +218,7 @@ def reset_password(request: HttpRequest, token: str):
         try:
             user = form.save()
             obj_token.delete()
-            send_password_changed_email.delay_on_commit(user.id)
+            enqueue_task(send_password_changed_email, user.id)
             messages.success(request, "Password reset successfully")
             return redirect("sign_in")
         except Exception as e:
@@ -12,6 +12,7 @@ class ShortenedLinkAdmin(admin.ModelAdmin):
         "updated_at",
         "remove_at",
         "is_active",
+        "clicks",
     ]
     list_filter = ["created_at", "updated_at", "is_active"]
     search_fields = ["original_link", "shortened_link", "user__username"]
@@ -0,0 +1,118 @@
+import logging
+from functools import cache
+
+from django.conf import settings
+from django.utils import timezone
+from redis import RedisError
+
+from sbily.utils.bloom import RedisBloomFilter
+from sbily.utils.metrics import LINK_FILTER_LOOKUPS
+from sbily.utils.redis import get_async_redis_connection
+from sbily.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+LINK_FILTER_KEY = "links:filter"
+LINK_FILTER_CAPACITY = getattr(settings, "LINK_FILTER_CAPACITY", 1_000_000)
+LINK_FILTER_ERROR_RATE = getattr(settings, "LINK_FILTER_ERROR_RATE", 0.01)
+
+filter_rejections = LINK_FILTER_LOOKUPS.labels("rejected")
+filter_false_positives = LINK_FILTER_LOOKUPS.labels("false_positive")
+
+
+@cache
+def get_link_filter() -> RedisBloomFilter:
+    """Returns the Bloom filter of every existing shortened link."""
+    return RedisBloomFilter(
+        get_redis_connection(),
+        LINK_FILTER_KEY,
+        capacity=LINK_FILTER_CAPACITY,
+        error_rate=LINK_FILTER_ERROR_RATE,
+    )
+
+
+def link_may_exist(shortened_link: str) -> bool:
+    """Checks whether a shortened link may exist without querying the database.
+
+    Returns True whenever the filter cannot be consulted, so lookups fall back
+    to the database.
+    """
+    try:
+        may_exist = get_link_filter().might_contain(shortened_link)
+    except RedisError:
+        logger.exception("Failed to check the shortened link filter")
+        return True
+    if not may_exist:
+        filter_rejections.inc()
+    return may_exist
+
+
+async def alink_may_exist(shortened_link: str) -> bool:
+    """Async version of ``link_may_exist``."""
+    try:
+        may_exist = await get_link_filter().amight_contain(
+            shortened_link,
+            get_async_redis_connection(),
+        )
+    except RedisError:
+        logger.exception("Failed to check the shortened link filter")
+        return True
+    if not may_exist:
+        filter_rejections.inc()
+    return may_exist
+
+
+def record_false_positive() -> None:
+    """Records a lookup the filter let through for a missing shortened link."""
+    filter_false_positives.inc()
+
+
+def add_link_to_filter(shortened_link: str) -> None:
+    """Adds a new or renamed shortened link to the filter.
+
+    If the link cannot be added, the filter is deleted so lookups fall back
+    to the database until the next rebuild, instead of reporting the link as
+    missing.
+
+    Raises:
+        RedisError: If the filter could not be deleted either, so the link is
+            not saved while the filter would answer a false negative for it.
+    """
+    link_filter = get_link_filter()
+    try:
+        link_filter.add(shortened_link)
+    except RedisError:
+        logger.exception("Failed to add %s to the link filter", shortened_link)
+        link_filter.clear()
+        logger.warning("Deleted the link filter until it is rebuilt")
+
+
+def populate_link_filter() -> int:
+    """Rebuilds the filter from the database.
+
+    Links added while the filter is being rebuilt are written to both
+    filters, and links saved shortly before or during the rebuild are added
+    again once it is swapped in, so they are never reported as missing.
+
+    Returns:
+        int: Number of shortened links in the rebuilt filter.
+    """
+    from .models import ShortenedLink
+
+    link_filter = get_link_filter()
+    started_at = timezone.now() - timezone.timedelta(minutes=1)
+    links = ShortenedLink.objects.values_list("shortened_link", flat=True)
+    count = link_filter.rebuild(links.iterator(chunk_size=5000))
+
+    for shortened_link in links.filter(updated_at__gte=started_at):
+        link_filter.add(shortened_link)
+    return count
+
+
+def get_link_filter_stats() -> dict[str, int | float | bool]:
+    """Returns the filter's size, memory footprint and expected false positive rate.
+
+    The lookups it rejected and let through are exported as the
+    ``sbily_link_filter_lookups`` metric by the processes serving them.
+    """
+    return get_link_filter().stats()
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django_redis.cache import RedisCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis import RedisError
+
+from sbily.utils.cache import LRUCache
+from sbily.utils.metrics import LINK_CACHE_LOOKUPS
+from sbily.utils.metrics import LINK_LOCAL_CACHE_REMOVALS
+from sbily.utils.redis import get_async_redis_connection
+from sbily.utils.redis import get_redis_connection
+
+if TYPE_CHECKING:
+    from .models import ShortenedLink
+
+logger = logging.getLogger(__name__)
+
+LINK_CACHE_PREFIX = "links:resolve:"
+# Changed on every invalidation; only needs to outlive a database read.
+LINK_VERSION_PREFIX = "links:version:"
+LINK_VERSION_TIMEOUT = 5 * 60
+LINK_CACHE_TIMEOUT = getattr(settings, "LINK_CACHE_TIMEOUT", 60 * 60 * 24)
+LINK_LOCAL_CACHE_MAX_SIZE = getattr(settings, "LINK_LOCAL_CACHE_MAX_SIZE", 10_000)
+LINK_LOCAL_CACHE_TIMEOUT = getattr(settings, "LINK_LOCAL_CACHE_TIMEOUT", 30)
+LINK_INVALIDATION_CHANNEL = "links:invalidate"
+LINK_RESOLVE_FIELDS = (
+    "id",
+    "shortened_link",
+    "original_link",
+    "is_active",
+    "remove_at",
+    "user_id",
+)
+
+local_cache = LRUCache(
+    LINK_LOCAL_CACHE_MAX_SIZE,
+    LINK_LOCAL_CACHE_TIMEOUT,
+    on_remove=lambda reason: LINK_LOCAL_CACHE_REMOVALS.labels(reason).inc(),
+)
+local_cache_hits = LINK_CACHE_LOOKUPS.labels("local", "hit")
+local_cache_misses = LINK_CACHE_LOOKUPS.labels("local", "miss")
+shared_cache_hits = LINK_CACHE_LOOKUPS.labels("shared", "hit")
+shared_cache_misses = LINK_CACHE_LOOKUPS.labels("shared", "miss")
+
+_listener_lock = threading.Lock()
+_listener_pid: int | None = None
+_listener_retry_at = 0.0
+_invalidation_generation = 0
+
+
+def link_cache_key(shortened_link: str) -> str:
+    """Returns the cache key used to store the resolution of a shortened link."""
+    return f"{LINK_CACHE_PREFIX}{shortened_link}"
+
+
+def link_version_key(shortened_link: str) -> str:
+    """Returns the cache key of the token changed when a link is invalidated."""
+    return f"{LINK_VERSION_PREFIX}{shortened_link}"
+
+
+def serialize_link(link: "ShortenedLink") -> dict[str, Any]:
+    """Returns the minimal data needed to resolve a shortened link."""
+    return {
+        "id": link.pk,
+        "original_link": link.original_link,
+        "is_active": link.is_active,
+        "remove_at": link.remove_at.isoformat() if link.remove_at else None,
+        "user_id": link.user_id,
+    }
+
+
+def deserialize_link(shortened_link: str, data: dict[str, Any]) -> "ShortenedLink":
+    """Builds an unsaved ShortenedLink instance from cached resolution data."""
+    from .models import ShortenedLink
+
+    return ShortenedLink(
+        id=data["id"],
+        shortened_link=shortened_link,
+        original_link=data["original_link"],
+        is_active=data["is_active"],
+        remove_at=parse_datetime(data["remove_at"]) if data["remove_at"] else None,
+        user_id=data["user_id"],
+    )
+
+
+def resolve_link(shortened_link: str) -> "ShortenedLink":
+    """Resolves a shortened link, reading through the local and shared caches.
+
+    Shortened links the Bloom filter knows do not exist are rejected without
+    querying the database.
+
+    Args:
+        shortened_link: The shortened link path to resolve.
+
+    Returns:
+        ShortenedLink: The resolved link. Instances served from a cache are
+        not bound to a database row and must not be saved.
+
+    Raises:
+        ShortenedLink.DoesNotExist: If the shortened link does not exist.
+    """
+    from .bloom import link_may_exist
+    from .bloom import record_false_positive
+    from .models import ShortenedLink
+
+    use_local_cache = start_invalidation_listener_soon()
+    key = link_cache_key(shortened_link)
+
+    data = local_cache.get(key) if use_local_cache else None
+    if data is not None:
+        local_cache_hits.inc()
+        return deserialize_link(shortened_link, data)
+    if use_local_cache:
+        local_cache_misses.inc()
+
+    generation = _invalidation_generation
+    version_key = link_version_key(shortened_link)
+    values = cache.get_many([key, version_key])
+    data = values.get(key)
+    if data is not None:
+        shared_cache_hits.inc()
+    else:
+        shared_cache_misses.inc()
+        if not link_may_exist(shortened_link):
+            raise ShortenedLink.DoesNotExist
+        try:
+            link = ShortenedLink.objects.only(*LINK_RESOLVE_FIELDS).get(
+                shortened_link=shortened_link,
+            )
+        except ShortenedLink.DoesNotExist:
+            record_false_positive()
+            raise
+        data = serialize_link(link)
+        # Undo the fill if the link was invalidated while it was being read.
+        cache.set(key, data, LINK_CACHE_TIMEOUT)
+        if cache.get(version_key) != values.get(version_key):
+            cache.delete(key)
+
+    # Skip the local tier if an invalidation arrived while reading, as the
+    # data may predate it.
+    if use_local_cache and generation == _invalidation_generation:
+        local_cache.set(key, data)
+    return deserialize_link(shortened_link, data)
+
+
+async def aresolve_link(shortened_link: str) -> "ShortenedLink":
+    """Async version of ``resolve_link``.
+
+    The shared cache is read with an asyncio Redis client when it is backed by
+    django-redis, and the database with the async ORM, so the event loop is
+    never blocked on I/O. The invalidation listener is started in a thread;
+    the local tier is skipped until it runs.
+    """
+    from .bloom import alink_may_exist
+    from .bloom import record_false_positive
+    from .models import ShortenedLink
+
+    use_local_cache = start_invalidation_listener()
+    key = link_cache_key(shortened_link)
+
+    data = local_cache.get(key) if use_local_cache else None
+    if data is not None:
+        local_cache_hits.inc()
+        return deserialize_link(shortened_link, data)
+    if use_local_cache:
+        local_cache_misses.inc()
+
+    generation = _invalidation_generation
+    version_key = link_version_key(shortened_link)
+    data, version = await _aget_shared(key, version_key)
+    if data is not None:
+        shared_cache_hits.inc()
+    else:
+        shared_cache_misses.inc()
+        if not await alink_may_exist(shortened_link):
+            raise ShortenedLink.DoesNotExist
+        try:
+            link = await ShortenedLink.objects.only(*LINK_RESOLVE_FIELDS).aget(
+                shortened_link=shortened_link,
+            )
+        except ShortenedLink.DoesNotExist:
+            record_false_positive()
+            raise
+        data = serialize_link(link)
+        await _afill_shared(key, data, version_key, version)
+
+    if use_local_cache and generation == _invalidation_generation:
+        local_cache.set(key, data)
+    return deserialize_link(shortened_link, data)
+
+
+async def _aget_shared(key: str, version_key: str) -> tuple[Any, Any]:
+    backend = caches["default"]
+    if not isinstance(backend, RedisCache):
+        values = await backend.aget_many([key, version_key])
+        return values.get(key), values.get(version_key)
+    try:
+        values = await get_async_redis_connection().mget(
+            backend.make_key(key),
+            backend.make_key(version_key),
+        )
+    except RedisError:
+        logger.exception("Failed to read %s from the cache", key)
+        return None, None
+    return tuple(
+        None if value is None else backend.client.decode(value) for value in values
+    )
+
+
+async def _afill_shared(
+    key: str,
+    data: dict[str, Any],
+    version_key: str,
+    version: Any,
+) -> None:
+    backend = caches["default"]
+    if not isinstance(backend, RedisCache):
+        await backend.aset(key, data, LINK_CACHE_TIMEOUT)
+        if await backend.aget(version_key) != version:
+            await backend.adelete(key)
+        return
+    connection = get_async_redis_connection()
+    try:
+        await connection.set(
+            backend.make_key(key),
+            backend.client.encode(data),
+            ex=LINK_CACHE_TIMEOUT,
+        )
+        current_version = await connection.get(backend.make_key(version_key))
+        if current_version is not None:
+            current_version = backend.client.decode(current_version)
+        if current_version != version:
+            await connection.delete(backend.make_key(key))
+    except RedisError:
+        logger.exception("Failed to write %s to the cache", key)
+
+
+def invalidate_links(*shortened_links: str | None) -> None:
+    """Removes the cached resolution of the given shortened links.
+
+    The caches are only invalidated once the current transaction commits, so
+    concurrent readers cannot repopulate them with the state being replaced.
+    The links' version tokens are changed too, so a reader that loaded a link
+    before the commit does not leave it in the shared cache. The invalidation
+    is broadcast to every process holding a local tier.
+    """
+    shortened_links = {link for link in shortened_links if link}
+    if shortened_links:
+        transaction.on_commit(lambda: _invalidate_links(shortened_links))
+
+
+def _invalidate_links(shortened_links: set[str]) -> None:
+    global _invalidation_generation  # noqa: PLW0603
+
+    keys = [link_cache_key(link) for link in shortened_links]
+    versions = {link_version_key(link): uuid.uuid4().hex for link in shortened_links}
+    # Bypass IGNORE_EXCEPTIONS, so a failed invalidation is logged.
+    backend = caches["default"]
+    client = backend.client if isinstance(backend, RedisCache) else backend
+    try:
+        client.set_many(versions, LINK_VERSION_TIMEOUT)
+        client.delete_many(keys)
+    except (ConnectionInterrupted, RedisError):
+        logger.exception(
+            "Failed to invalidate the cached links %s, they may be served "
+            "stale for up to %s seconds",
+            sorted(shortened_links),
+            LINK_CACHE_TIMEOUT,
+        )
+
+    _invalidation_generation += 1
+    local_cache.delete_many(keys)
+    if LINK_LOCAL_CACHE_MAX_SIZE <= 0:
+        return
+    try:
+        get_redis_connection().publish(LINK_INVALIDATION_CHANNEL, json.dumps(keys))
+    except RedisError:
+        logger.exception("Failed to broadcast link cache invalidation")
+
+
+def _handle_invalidation_message(message: dict[str, Any]) -> None:
+    global _invalidation_generation  # noqa: PLW0603
+
+    _invalidation_generation += 1
+    local_cache.delete_many(json.loads(message["data"]))
+
+
+def _handle_listener_error(error: Exception, pubsub, thread) -> None:
+    global _invalidation_generation  # noqa: PLW0603
+
+    # Messages may have been missed while disconnected, so drop everything.
+    logger.warning("Link cache invalidation listener error: %s", error)
+    _invalidation_generation += 1
+    local_cache.clear()
+    time.sleep(1)
+
+
+def start_invalidation_listener() -> bool:
+    """Starts the pub/sub listener that keeps the local tier consistent.
+
+    The listener runs in a daemon thread and is started lazily once per
+    process, so it is created after gunicorn or Celery fork their workers.
+
+    Returns:
+        bool: Whether the listener is running and the local tier can be used.
+    """
+    global _listener_pid, _listener_retry_at  # noqa: PLW0603
+
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return True
+    if LINK_LOCAL_CACHE_MAX_SIZE <= 0 or time.monotonic() < _listener_retry_at:
+        return False
+    with _listener_lock:
+        if _listener_pid == pid:
+            return True
+        local_cache.clear()
+        try:
+            pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(
+                **{LINK_INVALIDATION_CHANNEL: _handle_invalidation_message},
+            )
+        except RedisError:
+            logger.exception("Failed to start link cache invalidation listener")
+            _listener_retry_at = time.monotonic() + LINK_LOCAL_CACHE_TIMEOUT
+            return False
+        pubsub.run_in_thread(
+            sleep_time=1,
+            daemon=True,
+            exception_handler=_handle_listener_error,
+        )
+        _listener_pid = pid
+        return True
+
+
+def start_invalidation_listener_soon() -> bool:
+    """Starts the invalidation listener without blocking the event loop.
+
+    Subscribing connects to Redis, so the listener is started in the default
+    executor instead of on the event loop, and the local tier is not used
+    until it is running.
+
+    Returns:
+        bool: Whether the listener is running and the local tier can be used.
+    """
+    if _listener_pid == os.getpid():
+        return True
+    if LINK_LOCAL_CACHE_MAX_SIZE <= 0 or time.monotonic() < _listener_retry_at:
+        return False
+    if not _listener_lock.locked():
+        asyncio.get_running_loop().run_in_executor(None, start_invalidation_listener)
+    return False
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.test import Client
+from django.test import override_settings
+from django.urls import reverse
+
+from sbily.links.models import ShortenedLink
+
+FAST_PATH_MIDDLEWARE = "sbily.links.middleware.RedirectFastPathMiddleware"
+SECURITY_MIDDLEWARE = "django.middleware.security.SecurityMiddleware"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the requests/sec of the shortened link redirect with and "
+        "without the fast path middleware."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("shortened_link", help="An existing, active link.")
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=1000,
+            help="Number of requests sent for each run.",
+        )
+
+    def handle(self, *args, **options):
+        shortened_link = options["shortened_link"]
+        if not ShortenedLink.objects.filter(shortened_link=shortened_link).exists():
+            msg = f"Link {shortened_link} does not exist"
+            raise CommandError(msg)
+
+        path = reverse("redirect_link", kwargs={"shortened_link": shortened_link})
+        full_stack = [m for m in settings.MIDDLEWARE if m != FAST_PATH_MIDDLEWARE]
+        index = full_stack.index(SECURITY_MIDDLEWARE) + 1
+        runs = [
+            ("full stack", full_stack),
+            (
+                "fast path",
+                [*full_stack[:index], FAST_PATH_MIDDLEWARE, *full_stack[index:]],
+            ),
+        ]
+
+        results = {}
+        for name, middleware in runs:
+            with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=["*"]):
+                results[name] = self.run(path, options["requests"])
+            self.stdout.write(f"{name}: {results[name]:.1f} requests/sec")
+
+        speedup = results["fast path"] / results["full stack"]
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {speedup:.2f}x"))
+
+    def run(self, path: str, requests: int) -> float:
+        client = Client()
+        # Warm up caches and connections before measuring.
+        client.get(path, secure=True)
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(path, secure=True)
+            if response.status_code != 302:  # noqa: PLR2004
+                msg = f"Unexpected status code {response.status_code}"
+                raise CommandError(msg)
+        return requests / (time.perf_counter() - start)
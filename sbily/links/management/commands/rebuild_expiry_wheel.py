@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from sbily.links.models import ShortenedLink
+from sbily.users.models import Token
+from sbily.utils.expiry import get_expiry_wheel
+
+
+class Command(BaseCommand):
+    help = (
+        "Schedule the expiration of every temporary link and token in the "
+        "expiry wheel, e.g. after Redis data was lost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of entries added per Redis command.",
+        )
+
+    def handle(self, *args, **options):
+        wheel = get_expiry_wheel()
+        sources = [
+            (
+                "link",
+                ShortenedLink.objects.filter(remove_at__isnull=False).values_list(
+                    "pk",
+                    "remove_at",
+                ),
+            ),
+            ("token", Token.objects.values_list("pk", "expires_at")),
+        ]
+        for kind, rows in sources:
+            count = 0
+            batch = []
+            for object_id, expires_at in rows.iterator(
+                chunk_size=options["batch_size"],
+            ):
+                batch.append((kind, object_id, expires_at))
+                if len(batch) >= options["batch_size"]:
+                    wheel.schedule(batch)
+                    count += len(batch)
+                    batch = []
+            wheel.schedule(batch)
+            count += len(batch)
+            self.stdout.write(f"Scheduled {count} {kind} expirations.")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Expiry wheel rebuilt with {wheel.size()} entries."),
+        )
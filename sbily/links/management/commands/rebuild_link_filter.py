@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from sbily.links.bloom import get_link_filter_stats
+from sbily.links.bloom import populate_link_filter
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Bloom filter used to reject unknown shortened links."
+
+    def handle(self, *args, **options):
+        link_count = populate_link_filter()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt link filter with {link_count} links."),
+        )
+        for name, value in get_link_filter_stats().items():
+            self.stdout.write(f"{name}: {value}")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from sbily.links.utils import reconcile_user_link_counts
+
+
+class Command(BaseCommand):
+    help = "Repair the per-user link counters that drifted from the actual links."
+
+    def handle(self, *args, **options):
+        user_count = reconcile_user_link_counts()
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired the link counters of {user_count} users."),
+        )
@@ -0,0 +1,80 @@
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.shortcuts import redirect
+from django.urls import Resolver404
+from django.urls import resolve
+
+from .cache import aresolve_link
+from .cache import resolve_link
+from .stats import arecord_click
+from .stats import get_visitor_fingerprint
+from .stats import record_click
+
+LINK_PREFIX = getattr(settings, "LINK_PREFIX", "")
+
+
+class RedirectFastPathMiddleware:
+    """Redirects functional shortened links before the rest of the stack runs.
+
+    Sessions, CSRF, authentication, messages and the per-request transaction
+    are skipped for the happy path. Requests that need to show an error
+    (missing, expired or deactivated links) fall through to ``redirect_link``
+    and the full middleware stack.
+
+    Must be placed right after ``SecurityMiddleware``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path_prefix = f"/{LINK_PREFIX}"
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        shortened_link = self.get_shortened_link(request)
+        if shortened_link is not None:
+            try:
+                link = resolve_link(shortened_link)
+            except Exception:  # noqa: BLE001
+                # Missing links and errors are reported by redirect_link.
+                link = None
+            if link is not None and link.is_functional():
+                record_click(link.pk, get_visitor_fingerprint(request))
+                return redirect(link.original_link)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        shortened_link = self.get_shortened_link(request)
+        if shortened_link is not None:
+            try:
+                link = await aresolve_link(shortened_link)
+            except Exception:  # noqa: BLE001
+                link = None
+            if link is not None and link.is_functional():
+                await arecord_click(link.pk, get_visitor_fingerprint(request))
+                return redirect(link.original_link)
+        return await self.get_response(request)
+
+    def get_shortened_link(self, request) -> str | None:
+        """Returns the shortened link requested, if the route is redirect_link."""
+        path = request.path_info
+        if not path.startswith(self.path_prefix):
+            return None
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None
+        if match.url_name != "redirect_link":
+            return None
+
+        # Validate the Host header as the skipped middleware would.
+        request.get_host()
+        request.resolver_match = match
+        return match.kwargs["shortened_link"]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0008_alter_shortenedlink_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Redis key of the applied batch', max_length=255, unique=True, verbose_name='Key')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Click Batch',
+                'verbose_name_plural': 'Click Batches',
+            },
+        ),
+        migrations.AddField(
+            model_name='shortenedlink',
+            name='clicks',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='How many times this shortened link was followed', verbose_name='Clicks'),
+        ),
+        migrations.AddField(
+            model_name='shortenedlink',
+            name='last_clicked_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When this shortened link was last followed', null=True, verbose_name='Last Clicked At'),
+        ),
+    ]
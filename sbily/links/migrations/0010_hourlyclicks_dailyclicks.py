@@ -0,0 +1,44 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0009_shortenedlink_clicks_clickbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyClicks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Day of the clicks (UTC)', verbose_name='Day')),
+                ('clicks', models.PositiveBigIntegerField(default=0, help_text='How many times the link was followed during the day', verbose_name='Clicks')),
+                ('link', models.ForeignKey(help_text='Shortened link that was clicked', on_delete=django.db.models.deletion.CASCADE, related_name='daily_clicks', to='links.shortenedlink')),
+            ],
+            options={
+                'verbose_name': 'Daily Clicks',
+                'verbose_name_plural': 'Daily Clicks',
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('link', 'day'), name='unique_link_daily_clicks')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyClicks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour (UTC)', verbose_name='Hour')),
+                ('clicks', models.PositiveBigIntegerField(default=0, help_text='How many times the link was followed during the hour', verbose_name='Clicks')),
+                ('link', models.ForeignKey(help_text='Shortened link that was clicked', on_delete=django.db.models.deletion.CASCADE, related_name='hourly_clicks', to='links.shortenedlink')),
+            ],
+            options={
+                'verbose_name': 'Hourly Clicks',
+                'verbose_name_plural': 'Hourly Clicks',
+                'ordering': ['hour'],
+                'constraints': [models.UniqueConstraint(fields=('link', 'hour'), name='unique_link_hourly_clicks')],
+            },
+        ),
+    ]
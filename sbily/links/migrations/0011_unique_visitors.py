@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0010_hourlyclicks_dailyclicks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyclicks',
+            name='unique_visitors',
+            field=models.PositiveBigIntegerField(default=0, help_text='Estimated number of distinct visitors during the day', verbose_name='Unique Visitors'),
+        ),
+        migrations.AddField(
+            model_name='shortenedlink',
+            name='unique_visitors',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Estimated number of distinct visitors of this shortened link', verbose_name='Unique Visitors'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:52
+
+from django.db import migrations
+
+SEQUENCE = "links_shortcode_seq"
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} MINVALUE 0 START 0")
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0011_unique_visitors'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.8 on 2026-10-18 19:20
+
+from django.db import migrations
+
+
+def delete_remove_link_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name__startswith="Remove link").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('links', '0012_shortcode_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_remove_link_tasks, migrations.RunPython.noop),
+    ]
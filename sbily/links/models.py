@@ -1,5 +1,5 @@
-import json
-import secrets
+from collections import Counter
+from collections import defaultdict
 from urllib.parse import urljoin
 
 from django.conf import settings
@@ -12,12 +12,18 @@ from django.urls import reverse
 from django.utils import timezone
 from django.utils.timesince import timesince
 from django.utils.translation import gettext_lazy as _
-from django_celery_beat.models import ClockedSchedule
-from django_celery_beat.models import PeriodicTask
 
 from sbily.users.models import User
+from sbily.utils.expiry import schedule_expiration
 
-from .utils import user_can_create_link
+from .bloom import add_link_to_filter
+from .cache import invalidate_links
+from .shortcodes import SHORTCODE_ALLOCATOR
+from .shortcodes import allocate_shortcode
+from .shortcodes import discard_shortcodes
+from .shortcodes import generate_shortcode
+from .shortcodes import next_sequence_shortcode
+from .utils import reserve_user_links
 
 SITE_BASE_URL = settings.BASE_URL or ""
 
@@ -32,6 +38,24 @@ def future_date_validator(value: timezone.datetime) -> None:
         )
 
 
+class ShortenedLinkQuerySet(models.QuerySet):
+    def delete(self):
+        """Deletes the links, updating each of their users' counters once.
+
+        ``decrement_user_link_count`` records the deleted links in
+        ``deleted_link_counts`` instead of updating their user per link.
+        """
+        self.deleted_link_counts = defaultdict(Counter)
+        with transaction.atomic(using=self.db):
+            deleted = super().delete()
+            for user_id, counts in self.deleted_link_counts.items():
+                User.add_link_counts(
+                    user_id,
+                    **{field: -count for field, count in counts.items()},
+                )
+        return deleted
+
+
 class ShortenedLink(models.Model):
     SHORTENED_LINK_PATTERN = r"^[a-zA-Z0-9-_]*$"
     SHORTENED_LINK_MAX_LENGTH = 10
@@ -98,6 +122,27 @@ class ShortenedLink(models.Model):
         related_name="shortened_links",
         help_text=_("User who created this shortened link"),
     )
+    clicks = models.PositiveBigIntegerField(
+        _("Clicks"),
+        default=0,
+        editable=False,
+        help_text=_("How many times this shortened link was followed"),
+    )
+    last_clicked_at = models.DateTimeField(
+        _("Last Clicked At"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("When this shortened link was last followed"),
+    )
+    unique_visitors = models.PositiveBigIntegerField(
+        _("Unique Visitors"),
+        default=0,
+        editable=False,
+        help_text=_("Estimated number of distinct visitors of this shortened link"),
+    )
+
+    objects = ShortenedLinkQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Shortened Link")
@@ -116,48 +161,140 @@ class ShortenedLink(models.Model):
         if self.remove_at:
             current_timezone = timezone.get_current_timezone()
             self.remove_at = self.remove_at.replace(tzinfo=current_timezone)
-        self.full_clean()
-        if not self.shortened_link:
-            self._generate_unique_shortened_link()
-
-        super().save(*args, **kwargs)
-
-        if self.remove_at:
-            schedule, _ = ClockedSchedule.objects.get_or_create(
-                clocked_time=self.remove_at,
-            )
-            PeriodicTask.objects.update_or_create(
-                name=f"Remove link {self.id}",
-                defaults={
-                    "task": "delete_link_by_id",
-                    "args": json.dumps([self.pk]),
-                    "clocked": schedule,
-                    "one_off": True,
-                    "expires": self.remove_at + timezone.timedelta(minutes=1),
-                    "start_time": self.remove_at,
-                    "enabled": True,
-                },
-            )
+        loaded_values = getattr(self, "_loaded_values", {})
+        self.full_clean(exclude=self._get_unchanged_fields(loaded_values))
+        self._update_user_link_counts(self._get_previous_count_key(loaded_values))
+        if not self.shortened_link and SHORTCODE_ALLOCATOR == "sequence":
+            self._save_with_sequence_shortcode(*args, **kwargs)
         else:
-            PeriodicTask.objects.filter(name=f"Remove link {self.id}").delete()
+            if not self.shortened_link:
+                self.shortened_link = allocate_shortcode()
+                if not self.shortened_link:
+                    self._generate_unique_shortened_link()
+            elif self.shortened_link != loaded_values.get("shortened_link"):
+                discard_shortcodes(self.shortened_link)
+            super().save(*args, **kwargs)
+
+        invalidate_links(self.shortened_link, loaded_values.get("shortened_link"))
+        if self.shortened_link != loaded_values.get("shortened_link"):
+            add_link_to_filter(self.shortened_link)
+        if loaded_values.get("remove_at") != self.remove_at:
+            schedule_expiration("link", self.pk, self.remove_at)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
 
     def get_absolute_url(self) -> str:
         """Returns the absolute URL for this shortened link"""
         path = reverse("redirect_link", kwargs={"shortened_link": self.shortened_link})
         return urljoin(SITE_BASE_URL, path)
 
-    def clean(self) -> None:
-        user_can_create_link(self.id, self.remove_at, self.user)
-        super().clean()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values, strict=True))  # noqa: SLF001
+        return instance
+
+    def _get_unchanged_fields(self, loaded_values: dict) -> list[str]:
+        """Returns the fields whose validation can be skipped.
+
+        Fields still holding the value loaded from the database already passed
+        their validators (including the uniqueness check) when it was saved. A
+        user given as an instance is not looked up again either, the foreign
+        key constraint still guards the insert.
+        """
+        if ShortenedLink.user.is_cached(self) and self.user.pk == self.user_id:
+            unchanged_fields = ["user"]
+        else:
+            unchanged_fields = []
+        if self._state.adding:
+            return unchanged_fields
+        return unchanged_fields + [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in loaded_values
+            and field.name not in unchanged_fields
+            and loaded_values[field.attname] == getattr(self, field.attname)
+        ]
+
+    def _get_previous_count_key(self, loaded_values: dict) -> tuple | None:
+        """Returns the (user ID, is temporary) pair this link is counted under.
+
+        Returns None for new links.
+        """
+        if self._state.adding:
+            return None
+        if "user_id" in loaded_values and "remove_at" in loaded_values:
+            return loaded_values["user_id"], bool(loaded_values["remove_at"])
+        previous = (
+            ShortenedLink.objects.filter(pk=self.pk)
+            .values_list("user_id", "remove_at")
+            .first()
+        )
+        return previous and (previous[0], bool(previous[1]))
+
+    def _update_user_link_counts(self, previous_count_key: tuple | None) -> None:
+        """Moves this link between the users' link counters, if needed.
+
+        Raises:
+            ValidationError: If the user has no links of the new kind left.
+        """
+        current_count_key = (self.user_id, bool(self.remove_at))
+        if previous_count_key == current_count_key:
+            return
+
+        changes = defaultdict(dict)
+        for count_key, change in ((previous_count_key, -1), (current_count_key, 1)):
+            if count_key is not None:
+                user_id, is_temporary = count_key
+                field = "temp_links" if is_temporary else "links"
+                changes[user_id][field] = changes[user_id].get(field, 0) + change
+        for user_id, user_changes in changes.items():
+            reserve_user_links(user_id, **user_changes)
+            if ShortenedLink.user.is_cached(self) and self.user.pk == user_id:
+                for field, change in user_changes.items():
+                    count_field = f"{field}_count"
+                    setattr(
+                        self.user,
+                        count_field,
+                        getattr(self.user, count_field) + change,
+                    )
+
+    def _save_with_sequence_shortcode(self, *args, **kwargs) -> None:
+        """Saves the link with the next shortcode of the sequence.
+
+        Sequence shortcodes never collide with each other, only with a custom
+        shortcode that happens to match; the next number is used then.
+        """
+        while True:
+            self.shortened_link = next_sequence_shortcode()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+            except IntegrityError:
+                if not ShortenedLink.objects.filter(
+                    shortened_link=self.shortened_link,
+                ).exists():
+                    raise
+            else:
+                return
 
     def _generate_unique_shortened_link(self) -> None:
-        """Helper method to generate unique shortened link with retries"""
+        """Helper method to generate unique shortened link with retries
+
+        Only used when the shortcode pool is empty or unavailable.
+        """
         for retry in range(self.MAX_RETRIES):
             try:
-                self.shortened_link = secrets.token_urlsafe(8)[
-                    : self.SHORTENED_LINK_MAX_LENGTH
-                ]
-                self.full_clean()
+                self.shortened_link = generate_shortcode()
+                self.validate_unique(
+                    exclude=[
+                        field.name
+                        for field in self._meta.concrete_fields
+                        if field.name != "shortened_link"
+                    ],
+                )
                 break
             except (IntegrityError, ValidationError) as e:
                 if (
@@ -193,3 +330,89 @@ class ShortenedLink(models.Model):
         if not self.remove_at or self.is_expired():
             return _("Permanent")
         return timesince(timezone.now(), self.remove_at)
+
+
+class ClickBatch(models.Model):
+    """Records a batch of buffered clicks already applied to the database.
+
+    Flushing a batch and recording it happen in the same transaction, so a
+    retried flush can tell which batches it must not apply twice.
+    """
+
+    key = models.CharField(
+        _("Key"),
+        max_length=255,
+        unique=True,
+        help_text=_("Redis key of the applied batch"),
+    )
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("Click Batch")
+        verbose_name_plural = _("Click Batches")
+
+    def __str__(self) -> str:
+        return self.key
+
+
+class HourlyClicks(models.Model):
+    link = models.ForeignKey(
+        ShortenedLink,
+        on_delete=models.CASCADE,
+        related_name="hourly_clicks",
+        help_text=_("Shortened link that was clicked"),
+    )
+    hour = models.DateTimeField(_("Hour"), help_text=_("Start of the hour (UTC)"))
+    clicks = models.PositiveBigIntegerField(
+        _("Clicks"),
+        default=0,
+        help_text=_("How many times the link was followed during the hour"),
+    )
+
+    class Meta:
+        verbose_name = _("Hourly Clicks")
+        verbose_name_plural = _("Hourly Clicks")
+        ordering = ["hour"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["link", "hour"],
+                name="unique_link_hourly_clicks",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.link_id} - {self.hour:%Y-%m-%d %H:00}: {self.clicks}"
+
+
+class DailyClicks(models.Model):
+    link = models.ForeignKey(
+        ShortenedLink,
+        on_delete=models.CASCADE,
+        related_name="daily_clicks",
+        help_text=_("Shortened link that was clicked"),
+    )
+    day = models.DateField(_("Day"), help_text=_("Day of the clicks (UTC)"))
+    clicks = models.PositiveBigIntegerField(
+        _("Clicks"),
+        default=0,
+        help_text=_("How many times the link was followed during the day"),
+    )
+    unique_visitors = models.PositiveBigIntegerField(
+        _("Unique Visitors"),
+        default=0,
+        help_text=_("Estimated number of distinct visitors during the day"),
+    )
+
+    class Meta:
+        verbose_name = _("Daily Clicks")
+        verbose_name_plural = _("Daily Clicks")
+        ordering = ["day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["link", "day"],
+                name="unique_link_daily_clicks",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.link_id} - {self.day}: {self.clicks}"
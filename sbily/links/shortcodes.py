@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import secrets
+import string
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from redis import RedisError
+
+from sbily.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+SHORTCODE_POOL_KEY = "links:shortcodes"
+SHORTCODE_POOL_SIZE = getattr(settings, "SHORTCODE_POOL_SIZE", 10_000)
+SHORTCODE_POOL_BATCH_SIZE = getattr(settings, "SHORTCODE_POOL_BATCH_SIZE", 1000)
+SHORTCODE_LENGTH = 10
+
+# "pool" hands out random codes from SHORTCODE_POOL_KEY, "sequence" derives
+# them from SHORTCODE_SEQUENCE (PostgreSQL only).
+SHORTCODE_ALLOCATOR = getattr(settings, "SHORTCODE_ALLOCATOR", "pool")
+SHORTCODE_ALPHABET = string.ascii_letters + string.digits + "-_"
+SHORTCODE_SEQUENCE = "links_shortcode_seq"
+SHORTCODE_SEQUENCE_BLOCK_SIZE = getattr(settings, "SHORTCODE_SEQUENCE_BLOCK_SIZE", 100)
+SHORTCODE_MIN_LENGTH = getattr(settings, "SHORTCODE_MIN_LENGTH", 6)
+# Changing the salt changes which code each number maps to, so it must never
+# change once codes have been issued.
+SHORTCODE_SEQUENCE_SALT = getattr(settings, "SHORTCODE_SEQUENCE_SALT", "")
+
+_leased_numbers: deque[int] = deque()
+_leased_by_pid: int | None = None
+_lease_lock = threading.Lock()
+
+
+def generate_shortcode() -> str:
+    """Returns a random URL-safe shortcode."""
+    return secrets.token_urlsafe(8)[:SHORTCODE_LENGTH]
+
+
+def _multiplier(salt: str, index: int) -> int:
+    digest = hashlib.blake2b(f"{salt}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest) | 1
+
+
+def permute_number(number: int, bits: int) -> int:
+    """Maps ``number`` to another number of ``bits`` bits, one to one.
+
+    Each step (multiplying by an odd number, adding, xor-shifting) is a
+    bijection modulo ``2 ** bits``, so distinct numbers never share a code,
+    while consecutive numbers map to unrelated ones.
+    """
+    if not SHORTCODE_SEQUENCE_SALT:
+        return number
+    mask = (1 << bits) - 1
+    shift = bits // 2
+    number = (number * _multiplier(SHORTCODE_SEQUENCE_SALT, 0) + bits) & mask
+    number ^= number >> shift
+    number = (number * _multiplier(SHORTCODE_SEQUENCE_SALT, 1)) & mask
+    return number ^ (number >> shift)
+
+
+def encode_shortcode(number: int) -> str:
+    """Encodes a sequence number into a shortcode.
+
+    Numbers are spread over codes of ``SHORTCODE_MIN_LENGTH`` characters
+    first; each extra character only comes into use once every shorter code
+    has been issued. Codes of different lengths never collide.
+
+    Raises:
+        OverflowError: If ``number`` does not fit in ``SHORTCODE_LENGTH``
+            characters.
+    """
+    base = len(SHORTCODE_ALPHABET)
+    length = SHORTCODE_MIN_LENGTH
+    while number >= base**length:
+        length += 1
+    if length > SHORTCODE_LENGTH:
+        msg = f"Shortcode number {number} is too large"
+        raise OverflowError(msg)
+
+    number = permute_number(number, (base - 1).bit_length() * length)
+    chars = []
+    for _ in range(length):
+        number, index = divmod(number, base)
+        chars.append(SHORTCODE_ALPHABET[index])
+    return "".join(reversed(chars))
+
+
+def lease_sequence_numbers(count: int) -> list[int]:
+    """Takes ``count`` numbers from the shortcode sequence in one query."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            [SHORTCODE_SEQUENCE, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def next_sequence_shortcode() -> str:
+    """Returns the shortcode of the next number leased by this process.
+
+    Numbers are leased from the database ``SHORTCODE_SEQUENCE_BLOCK_SIZE`` at
+    a time. Numbers leased but never used (e.g. when the process exits) are
+    simply skipped.
+    """
+    global _leased_by_pid  # noqa: PLW0603
+
+    with _lease_lock:
+        if _leased_by_pid != os.getpid():
+            # Never reuse numbers leased by the parent of a forked worker.
+            _leased_numbers.clear()
+            _leased_by_pid = os.getpid()
+        if not _leased_numbers:
+            _leased_numbers.extend(
+                lease_sequence_numbers(SHORTCODE_SEQUENCE_BLOCK_SIZE),
+            )
+        number = _leased_numbers.popleft()
+    return encode_shortcode(number)
+
+
+def allocate_shortcode() -> str | None:
+    """Pops a pre-verified unused shortcode from the pool.
+
+    Returns:
+        str | None: The shortcode, or None if the pool is empty or Redis is
+        unavailable, in which case the caller generates one itself.
+    """
+    try:
+        shortcode = get_redis_connection().spop(SHORTCODE_POOL_KEY)
+    except RedisError:
+        logger.exception("Failed to allocate a shortcode from the pool")
+        return None
+    if shortcode is None:
+        logger.warning("The shortcode pool is empty")
+    return shortcode
+
+
+def discard_shortcodes(*shortcodes: str | None) -> None:
+    """Removes shortcodes chosen by users from the pool."""
+    shortcodes = [shortcode for shortcode in shortcodes if shortcode]
+    if not shortcodes:
+        return
+    try:
+        get_redis_connection().srem(SHORTCODE_POOL_KEY, *shortcodes)
+    except RedisError:
+        logger.exception("Failed to remove shortcodes from the pool")
+
+
+def refill_shortcode_pool() -> int:
+    """Tops the pool up to ``SHORTCODE_POOL_SIZE`` unused shortcodes.
+
+    Candidates are generated in batches and checked against the database with
+    a single ``IN`` query per batch.
+
+    Returns:
+        int: Number of shortcodes added.
+    """
+    from .models import ShortenedLink
+
+    if SHORTCODE_ALLOCATOR != "pool":
+        return 0
+
+    redis = get_redis_connection()
+    added = 0
+    while (missing := SHORTCODE_POOL_SIZE - redis.scard(SHORTCODE_POOL_KEY)) > 0:
+        candidates = {
+            generate_shortcode() for _ in range(min(missing, SHORTCODE_POOL_BATCH_SIZE))
+        }
+        candidates.difference_update(
+            ShortenedLink.objects.filter(shortened_link__in=candidates).values_list(
+                "shortened_link",
+                flat=True,
+            ),
+        )
+        if candidates:
+            added += redis.sadd(SHORTCODE_POOL_KEY, *candidates)
+    return added
@@ -1,18 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
-from django_celery_beat.models import PeriodicTask
 
+from sbily.users.models import User
+from sbily.utils.expiry import schedule_expiration
+
+from .cache import invalidate_links
 from .models import ShortenedLink
+from .models import ShortenedLinkQuerySet
+from .stats import forget_unique_visitors
+
+
+@receiver(pre_delete, sender=ShortenedLink)
+def invalidate_link_cache(sender: type, instance: ShortenedLink, **kwargs) -> None:
+    """
+    Remove the cached resolution of a ShortenedLink when it is deleted.
+
+    Queryset deletes also go through this receiver, as Django sends
+    ``pre_delete`` for every collected instance when receivers are connected.
+
+    Args:
+        sender: The model class that sent the signal
+        instance: The actual instance being deleted
+        **kwargs: Additional keyword arguments passed by the signal
+    """
+    invalidate_links(instance.shortened_link)
+
+
+@receiver(pre_delete, sender=ShortenedLink)
+def delete_unique_visitors(sender: type, instance: ShortenedLink, **kwargs) -> None:
+    """
+    Delete the unique visitor estimate of a ShortenedLink once it is deleted.
+
+    Args:
+        sender: The model class that sent the signal
+        instance: The actual instance being deleted
+        **kwargs: Additional keyword arguments passed by the signal
+    """
+    link_id = instance.id
+    transaction.on_commit(lambda: forget_unique_visitors(link_id))
+
+
+@receiver(post_delete, sender=ShortenedLink)
+def decrement_user_link_count(sender: type, instance: ShortenedLink, **kwargs) -> None:
+    """
+    Remove a deleted ShortenedLink from its user's link counters.
+
+    Links deleted by a queryset are only tallied here; the queryset updates
+    each user once afterwards. Links deleted with their user are skipped.
+
+    Args:
+        sender: The model class that sent the signal
+        instance: The actual instance being deleted
+        **kwargs: Additional keyword arguments passed by the signal
+    """
+    field = "temp_links" if instance.remove_at else "links"
+    origin = kwargs.get("origin")
+    if isinstance(origin, ShortenedLinkQuerySet):
+        origin.deleted_link_counts[instance.user_id][field] += 1
+    elif isinstance(origin, ShortenedLink):
+        User.add_link_counts(instance.user_id, **{field: -1})
 
 
 @receiver(pre_delete, sender=ShortenedLink)
-def cancel_remove_link_task(sender: type, instance: ShortenedLink, **kwargs) -> None:
+def cancel_link_expiration(sender: type, instance: ShortenedLink, **kwargs) -> None:
     """
-    Cancel the periodic task for removing a link when a ShortenedLink is deleted.
+    Cancel the scheduled expiration of a temporary ShortenedLink when it is deleted.
 
     Args:
         sender: The model class that sent the signal
         instance: The actual instance being deleted
         **kwargs: Additional keyword arguments passed by the signal
     """
-    PeriodicTask.objects.filter(name=f"Remove link {instance.id}").delete()
+    if instance.remove_at:
+        schedule_expiration("link", instance.id, None)
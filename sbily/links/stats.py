@@ -0,0 +1,446 @@
+import hashlib
+import hmac
+import logging
+import time
+from collections.abc import Callable
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from functools import cache
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from redis import RedisError
+from redis.commands.core import Script
+
+from sbily.utils.redis import get_async_redis_connection
+from sbily.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CLICKS_KEY = "links:clicks"
+PENDING_BATCHES_KEY = "links:clicks:pending"
+HOURLY_CLICKS_PREFIX = "links:clicks:hour:"
+OPEN_HOURS_KEY = "links:clicks:hours"
+UNIQUES_PREFIX = "links:uniques:"
+DIRTY_UNIQUES_KEY = "links:uniques:dirty"
+# Daily estimates are persisted within minutes; the key only has to outlive
+# the day plus a few failed runs.
+DAILY_UNIQUES_TIMEOUT = 60 * 60 * 24 * 2
+CLICK_FLUSH_BATCH_SIZE = getattr(settings, "CLICK_FLUSH_BATCH_SIZE", 1000)
+HOURLY_CLICKS_RETENTION_DAYS = getattr(settings, "HOURLY_CLICKS_RETENTION_DAYS", 7)
+DAILY_CLICKS_ROLLUP_DAYS = getattr(settings, "DAILY_CLICKS_ROLLUP_DAYS", 2)
+TRUSTED_PROXY_COUNT = getattr(settings, "TRUSTED_PROXY_COUNT", 0)
+
+# Atomically moves a live buffer to a uniquely named batch and tracks it, so
+# new clicks keep accumulating while the batch is flushed.
+CLAIM_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+redis.call("RENAME", KEYS[1], KEYS[2])
+redis.call("SADD", KEYS[3], KEYS[2])
+return 1
+"""
+
+UPDATE_CLICKS_ROW = "(%s::bigint, %s::bigint, %s::timestamptz)"
+UPDATE_CLICKS_SQL = """
+UPDATE {table} AS link
+SET clicks = link.clicks + batch.clicks,
+    last_clicked_at = GREATEST(link.last_clicked_at, batch.last_clicked_at)
+FROM (VALUES {values}) AS batch (id, clicks, last_clicked_at)
+WHERE link.id = batch.id
+"""
+
+UPSERT_HOURLY_CLICKS_ROW = "(%s::bigint, %s::timestamptz, %s::bigint)"
+UPSERT_HOURLY_CLICKS_SQL = """
+INSERT INTO {table} AS hourly (link_id, hour, clicks)
+SELECT bucket.link_id, bucket.hour, bucket.clicks
+FROM (VALUES {values}) AS bucket (link_id, hour, clicks)
+JOIN {links_table} AS link ON link.id = bucket.link_id
+ON CONFLICT (link_id, hour) DO UPDATE
+SET clicks = hourly.clicks + EXCLUDED.clicks
+"""
+
+UPDATE_UNIQUES_ROW = "(%s::bigint, %s::bigint)"
+UPDATE_UNIQUES_SQL = """
+UPDATE {table} AS link
+SET unique_visitors = estimate.unique_visitors
+FROM (VALUES {values}) AS estimate (id, unique_visitors)
+WHERE link.id = estimate.id
+"""
+
+UPSERT_DAILY_UNIQUES_ROW = "(%s::bigint, %s::date, %s::bigint)"
+UPSERT_DAILY_UNIQUES_SQL = """
+INSERT INTO {table} AS daily (link_id, day, clicks, unique_visitors)
+SELECT estimate.link_id, estimate.day, 0, estimate.unique_visitors
+FROM (VALUES {values}) AS estimate (link_id, day, unique_visitors)
+JOIN {links_table} AS link ON link.id = estimate.link_id
+ON CONFLICT (link_id, day) DO UPDATE
+SET unique_visitors = EXCLUDED.unique_visitors
+"""
+
+ROLLUP_DAILY_CLICKS_SQL = """
+INSERT INTO {table} AS daily (link_id, day, clicks, unique_visitors)
+SELECT link_id, (hour AT TIME ZONE 'UTC')::date, SUM(clicks), 0
+FROM {hourly_table}
+WHERE hour >= %s
+GROUP BY 1, 2
+ON CONFLICT (link_id, day) DO UPDATE
+SET clicks = EXCLUDED.clicks
+"""
+
+
+@cache
+def get_claim_script() -> Script:
+    return get_redis_connection().register_script(CLAIM_SCRIPT)
+
+
+def get_hour_bucket(timestamp: float) -> str:
+    """Returns the UTC hour bucket (``YYYYmmddHH``) of a Unix timestamp."""
+    return time.strftime("%Y%m%d%H", time.gmtime(timestamp))
+
+
+def get_client_address(request) -> str:
+    """Returns the address of the client that sent ``request``.
+
+    Behind ``TRUSTED_PROXY_COUNT`` proxies, this is the ``X-Forwarded-For``
+    entry the outermost proxy appended, counted from the right. Entries to
+    its left are sent by the client and can be forged, so they are ignored.
+    """
+    if TRUSTED_PROXY_COUNT > 0:
+        forwarded_for = [
+            address.strip()
+            for address in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+            if address.strip()
+        ]
+        if len(forwarded_for) >= TRUSTED_PROXY_COUNT:
+            return forwarded_for[-TRUSTED_PROXY_COUNT]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def get_visitor_fingerprint(request) -> str:
+    """Returns a keyed hash identifying the client that sent ``request``.
+
+    The client address (see ``get_client_address``) and user agent are hashed
+    with the secret key, so no personal data is stored in Redis.
+    """
+    address = get_client_address(request)
+    user_agent = request.META.get("HTTP_USER_AGENT", "")
+    return hmac.new(
+        settings.SECRET_KEY.encode(),
+        f"{address}|{user_agent}".encode(),
+        hashlib.sha256,
+    ).hexdigest()[:32]
+
+
+def _queue_click(pipe, link_id: int, visitor: str | None, now: float) -> None:
+    hour = get_hour_bucket(now)
+    pipe.hincrby(CLICKS_KEY, f"c:{link_id}", 1)
+    pipe.hset(CLICKS_KEY, f"t:{link_id}", int(now))
+    pipe.hincrby(f"{HOURLY_CLICKS_PREFIX}{hour}", link_id, 1)
+    pipe.sadd(OPEN_HOURS_KEY, hour)
+    if visitor is not None:
+        day_key = f"{UNIQUES_PREFIX}{link_id}:{hour[:8]}"
+        pipe.pfadd(f"{UNIQUES_PREFIX}{link_id}", visitor)
+        pipe.pfadd(day_key, visitor)
+        pipe.expire(day_key, DAILY_UNIQUES_TIMEOUT)
+        pipe.sadd(DIRTY_UNIQUES_KEY, link_id)
+
+
+def record_click(link_id: int, visitor: str | None = None) -> None:
+    """Buffers a click on a shortened link in Redis.
+
+    The click is added to the link's total and to the current hour bucket,
+    and ``visitor`` (see ``get_visitor_fingerprint``) to the link's all-time
+    and daily unique visitor estimates. Nothing is written to the database;
+    ``flush_clicks``, ``compact_hourly_clicks`` and
+    ``persist_unique_visitors`` apply the buffered data in bulk.
+    """
+    pipe = get_redis_connection().pipeline(transaction=False)
+    _queue_click(pipe, link_id, visitor, time.time())
+    try:
+        pipe.execute()
+    except RedisError:
+        logger.exception("Failed to record click on link %s", link_id)
+
+
+async def arecord_click(link_id: int, visitor: str | None = None) -> None:
+    """Async version of ``record_click``."""
+    try:
+        async with get_async_redis_connection().pipeline(transaction=False) as pipe:
+            _queue_click(pipe, link_id, visitor, time.time())
+            await pipe.execute()
+    except RedisError:
+        logger.exception("Failed to record click on link %s", link_id)
+
+
+def claim_batch(key: str) -> None:
+    """Moves the buffer stored at ``key`` to a new pending batch, if any."""
+    batch_key = f"{key}:batch:{uuid4().hex}"
+    get_claim_script()(keys=[key, batch_key, PENDING_BATCHES_KEY])
+
+
+def apply_pending_batches(
+    prefix: str,
+    apply: Callable[[str, dict[str, str]], None],
+) -> int:
+    """Applies every pending batch whose key starts with ``prefix``.
+
+    Each batch is applied in a transaction that also records it as a
+    ``ClickBatch``. Batches left over by a failed or retried run are applied
+    again only if that record was never committed, so running this again
+    never counts clicks twice.
+
+    Args:
+        prefix: Key prefix of the batches to apply.
+        apply: Function writing the batch to the database, called with the
+            batch's key and hash.
+
+    Returns:
+        int: Number of batches applied.
+    """
+    from .models import ClickBatch
+
+    redis = get_redis_connection()
+    applied = 0
+    for batch_key in sorted(redis.smembers(PENDING_BATCHES_KEY)):
+        if not batch_key.startswith(prefix):
+            continue
+        with transaction.atomic():
+            _, created = ClickBatch.objects.get_or_create(key=batch_key)
+            if created:
+                apply(batch_key, redis.hgetall(batch_key))
+                applied += 1
+        redis.delete(batch_key)
+        redis.srem(PENDING_BATCHES_KEY, batch_key)
+    return applied
+
+
+def parse_clicks(batch: dict[str, str]) -> list[tuple[int, int, datetime]]:
+    """Returns ``(link_id, clicks, last_clicked_at)`` rows from a click batch."""
+    rows = []
+    for field, value in batch.items():
+        kind, link_id = field.split(":", 1)
+        if kind != "c":
+            continue
+        last_clicked_at = datetime.fromtimestamp(
+            int(batch.get(f"t:{link_id}", time.time())),
+            tz=UTC,
+        )
+        rows.append((int(link_id), int(value), last_clicked_at))
+    return rows
+
+
+def update_clicks(batch_key: str, batch: dict[str, str]) -> None:
+    """Adds a batch of buffered clicks to ``ShortenedLink`` in bulk updates."""
+    from .models import ShortenedLink
+
+    rows = parse_clicks(batch)
+    table = connection.ops.quote_name(ShortenedLink._meta.db_table)  # noqa: SLF001
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), CLICK_FLUSH_BATCH_SIZE):
+            chunk = rows[start : start + CLICK_FLUSH_BATCH_SIZE]
+            values = ", ".join([UPDATE_CLICKS_ROW] * len(chunk))
+            cursor.execute(
+                UPDATE_CLICKS_SQL.format(table=table, values=values),
+                [value for row in chunk for value in row],
+            )
+
+
+def flush_clicks() -> int:
+    """Moves the buffered clicks to the database.
+
+    Returns:
+        int: Number of batches applied.
+    """
+    claim_batch(CLICKS_KEY)
+    return apply_pending_batches(f"{CLICKS_KEY}:batch:", update_clicks)
+
+
+def upsert_hourly_clicks(batch_key: str, batch: dict[str, str]) -> None:
+    """Adds a batch of hour bucket counters to ``HourlyClicks`` in bulk upserts.
+
+    Clicks on links deleted in the meantime are dropped.
+    """
+    from .models import HourlyClicks
+    from .models import ShortenedLink
+
+    hour = batch_key.removeprefix(HOURLY_CLICKS_PREFIX).split(":", 1)[0]
+    hour_start = datetime.strptime(hour, "%Y%m%d%H").replace(tzinfo=UTC)
+    rows = [
+        (int(link_id), hour_start, int(clicks)) for link_id, clicks in batch.items()
+    ]
+    table = connection.ops.quote_name(HourlyClicks._meta.db_table)  # noqa: SLF001
+    links_table = connection.ops.quote_name(ShortenedLink._meta.db_table)  # noqa: SLF001
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), CLICK_FLUSH_BATCH_SIZE):
+            chunk = rows[start : start + CLICK_FLUSH_BATCH_SIZE]
+            values = ", ".join([UPSERT_HOURLY_CLICKS_ROW] * len(chunk))
+            cursor.execute(
+                UPSERT_HOURLY_CLICKS_SQL.format(
+                    table=table,
+                    links_table=links_table,
+                    values=values,
+                ),
+                [value for row in chunk for value in row],
+            )
+
+
+def compact_hourly_clicks() -> int:
+    """Moves the counters of every closed hour bucket to ``HourlyClicks``.
+
+    The current hour keeps accumulating in Redis. Clicks that land in a
+    bucket after it was compacted reopen it and are added by the next run.
+
+    Returns:
+        int: Number of batches applied.
+    """
+    redis = get_redis_connection()
+    current_hour = get_hour_bucket(time.time())
+    for hour in redis.smembers(OPEN_HOURS_KEY):
+        if hour >= current_hour:
+            continue
+        redis.srem(OPEN_HOURS_KEY, hour)
+        try:
+            claim_batch(f"{HOURLY_CLICKS_PREFIX}{hour}")
+        except RedisError:
+            redis.sadd(OPEN_HOURS_KEY, hour)
+            raise
+    return apply_pending_batches(HOURLY_CLICKS_PREFIX, upsert_hourly_clicks)
+
+
+def persist_unique_visitors() -> int:
+    """Stores the unique visitor estimates of recently clicked links.
+
+    The all-time estimate is written to ``ShortenedLink.unique_visitors`` and
+    today's (and yesterday's, so late visitors are not lost at midnight) to
+    ``DailyClicks.unique_visitors``. Links are marked again if the database
+    write fails.
+
+    Returns:
+        int: Number of links updated.
+    """
+    from .models import DailyClicks
+    from .models import ShortenedLink
+
+    redis = get_redis_connection()
+    today = datetime.now(tz=UTC).date()
+    days = [today - timedelta(days=1), today]
+    table = connection.ops.quote_name(ShortenedLink._meta.db_table)  # noqa: SLF001
+    daily_table = connection.ops.quote_name(DailyClicks._meta.db_table)  # noqa: SLF001
+    updated = 0
+    while link_ids := redis.spop(DIRTY_UNIQUES_KEY, CLICK_FLUSH_BATCH_SIZE):
+        pipe = redis.pipeline(transaction=False)
+        for link_id in link_ids:
+            pipe.pfcount(f"{UNIQUES_PREFIX}{link_id}")
+            for day in days:
+                pipe.pfcount(f"{UNIQUES_PREFIX}{link_id}:{day:%Y%m%d}")
+        counts = iter(pipe.execute())
+        totals, daily = [], []
+        for link_id in link_ids:
+            totals.append((int(link_id), next(counts)))
+            daily.extend(
+                (int(link_id), day, count)
+                for day, count in zip(days, counts, strict=False)
+                if count
+            )
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    UPDATE_UNIQUES_SQL.format(
+                        table=table,
+                        values=", ".join([UPDATE_UNIQUES_ROW] * len(totals)),
+                    ),
+                    [value for row in totals for value in row],
+                )
+                if daily:
+                    cursor.execute(
+                        UPSERT_DAILY_UNIQUES_SQL.format(
+                            table=daily_table,
+                            links_table=table,
+                            values=", ".join([UPSERT_DAILY_UNIQUES_ROW] * len(daily)),
+                        ),
+                        [value for row in daily for value in row],
+                    )
+        except Exception:
+            redis.sadd(DIRTY_UNIQUES_KEY, *link_ids)
+            raise
+        updated += len(link_ids)
+    return updated
+
+
+def forget_unique_visitors(link_id: int) -> None:
+    """Deletes the all-time unique visitor estimate of a deleted link.
+
+    Daily estimates expire on their own.
+    """
+    try:
+        get_redis_connection().delete(f"{UNIQUES_PREFIX}{link_id}")
+    except RedisError:
+        logger.exception("Failed to delete unique visitors of link %s", link_id)
+
+
+def rollup_daily_clicks() -> tuple[int, int]:
+    """Recomputes the recent ``DailyClicks`` rows and prunes old hourly rows.
+
+    Days within ``DAILY_CLICKS_ROLLUP_DAYS`` (including today) are rewritten
+    from their hourly rows, so running this again is harmless. Hourly rows
+    older than ``HOURLY_CLICKS_RETENTION_DAYS`` are then deleted.
+
+    Returns:
+        tuple[int, int]: Number of daily rows written and hourly rows deleted.
+    """
+    from .models import DailyClicks
+    from .models import HourlyClicks
+
+    today = datetime.now(tz=UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+    table = connection.ops.quote_name(DailyClicks._meta.db_table)  # noqa: SLF001
+    hourly_table = connection.ops.quote_name(HourlyClicks._meta.db_table)  # noqa: SLF001
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            ROLLUP_DAILY_CLICKS_SQL.format(table=table, hourly_table=hourly_table),
+            [today - timedelta(days=DAILY_CLICKS_ROLLUP_DAYS - 1)],
+        )
+        rolled_up = cursor.rowcount
+        pruned, _ = HourlyClicks.objects.filter(
+            hour__lt=today - timedelta(days=HOURLY_CLICKS_RETENTION_DAYS),
+        ).delete()
+    return rolled_up, pruned
+
+
+def get_click_series(link, hours: int = 24, days: int = 30) -> dict[str, list]:
+    """Returns the recent hourly and daily click series of a link.
+
+    Each point is a ``(start, clicks, percent)`` tuple, where ``percent`` is
+    relative to the busiest point of its series. Periods without clicks have
+    no rows and are filled with zeros.
+    """
+    now = datetime.now(tz=UTC)
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    hour_starts = [current_hour - timedelta(hours=i) for i in reversed(range(hours))]
+    hourly = dict(
+        link.hourly_clicks.filter(hour__gte=hour_starts[0]).values_list(
+            "hour",
+            "clicks",
+        ),
+    )
+    day_starts = [now.date() - timedelta(days=i) for i in reversed(range(days))]
+    daily = dict(
+        link.daily_clicks.filter(day__gte=day_starts[0]).values_list("day", "clicks"),
+    )
+    return {
+        "hourly": _to_series(hour_starts, hourly),
+        "daily": _to_series(day_starts, daily),
+    }
+
+
+def _to_series(starts: list, clicks: dict) -> list[tuple]:
+    values = [clicks.get(start, 0) for start in starts]
+    peak = max(values, default=0) or 1
+    return [
+        (start, value, round(value * 100 / peak))
+        for start, value in zip(starts, values, strict=True)
+    ]
@@ -1,111 +1,327 @@
+import time
 from collections import defaultdict
+from datetime import datetime
+from typing import NamedTuple
 
 from celery import shared_task
+from celery.utils.log import get_task_logger
 from django.conf import settings
 from django.db import transaction
+from django.db.models import BooleanField
+from django.db.models import Case
+from django.db.models import ExpressionWrapper
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import When
+from django.db.models import Window
+from django.db.models.functions import RowNumber
 from django.template.loader import render_to_string
 from django.utils.timezone import now
+from django.utils.timezone import timedelta
 
-from sbily.notifications.models import Notification
+from sbily.notifications.utils import NotificationWriter
 from sbily.users.models import User
+from sbily.utils.tasks import PRIORITY_HIGH
+from sbily.utils.tasks import PRIORITY_LOW
 from sbily.utils.tasks import default_task_params
 from sbily.utils.tasks import task_response
 
+from .bloom import get_link_filter_stats
+from .bloom import populate_link_filter
+from .models import ClickBatch
 from .models import ShortenedLink
+from .shortcodes import refill_shortcode_pool
+from .stats import compact_hourly_clicks
+from .stats import flush_clicks
+from .stats import persist_unique_visitors
+from .stats import rollup_daily_clicks
+
+logger = get_task_logger(__name__)
 
 SITE_BASE_URL = settings.BASE_URL or ""
+EXPIRED_LINKS_BATCH_SIZE = getattr(settings, "EXPIRED_LINKS_BATCH_SIZE", 500)
+EXPIRED_LINKS_TIME_BUDGET = getattr(settings, "EXPIRED_LINKS_TIME_BUDGET", 45)
+NOTIFICATION_MAX_LISTED_LINKS = getattr(settings, "NOTIFICATION_MAX_LISTED_LINKS", 20)
+
+
+class DeletedLink(NamedTuple):
+    """The fields of a deleted link listed in its user's notification."""
+
+    user_id: int
+    shortened_link: str
+    original_link: str
+
+    @classmethod
+    def from_link(cls, link: ShortenedLink) -> "DeletedLink":
+        return cls(link.user_id, link.shortened_link, link.original_link)
 
 
 def send_notification_deleted_links(
-    user: User,
-    links: list[ShortenedLink],
+    user: User | int,
+    links: list[ShortenedLink | DeletedLink],
+    writer: NotificationWriter | None = None,
     **kwargs,
 ) -> None:
     """
     Send a notification to the user when their links have been deleted.
 
+    At most ``NOTIFICATION_MAX_LISTED_LINKS`` links are listed.
+
     Args:
-        user: The user to notify.
+        user: The user (or their ID) to notify.
         links: List of deleted links.
+        writer: Writer collecting the notification, if it should be created
+            in bulk with others.
         **kwargs: Additional context data.
     """
     context = kwargs.copy()
-    context["links"] = links
+    context["links"] = links[:NOTIFICATION_MAX_LISTED_LINKS]
     context.setdefault("links_count", len(links))
+    context["more_links_count"] = context["links_count"] - len(context["links"])
 
     content = render_to_string("notifications/links/links_deleted.md", context)
 
-    Notification.objects.create(
-        title="Your links have been deleted!",
-        user=user,
-        content=content,
-    )
+    if writer is None:
+        with NotificationWriter() as single_writer:
+            single_writer.add(user, "Your links have been deleted!", content)
+    else:
+        writer.add(user, "Your links have been deleted!", content)
 
 
-@shared_task(**default_task_params("delete_expired_links", acks_late=True))
-def delete_expired_links(self) -> dict:
-    """Delete expired links from the database."""
-    expired_links = ShortenedLink.objects.select_related("user").filter(
-        remove_at__lte=now(),
+def delete_due_links(
+    link_ids: list[int] | None = None,
+    limit: int | None = None,
+    after: tuple[datetime, int] | None = None,
+    pk_range: list[int] | None = None,
+) -> list[ShortenedLink]:
+    """Deletes a chunk of due links in its own transaction.
+
+    Only due links are read, through the ``remove_at`` index, in
+    ``(remove_at, id)`` order. They are locked with ``SKIP LOCKED``, so
+    overlapping runs split the work instead of waiting on each other.
+
+    Args:
+        link_ids: Only consider these links, if given.
+        limit: Maximum number of links to delete.
+        after: Only consider links after this ``(remove_at, id)`` key, i.e. the
+            key of the last link of the previous chunk.
+        pk_range: Only consider links with primary keys in this inclusive range.
+
+    Returns:
+        list[ShortenedLink]: The deleted links, in keyset order.
+    """
+    links = (
+        ShortenedLink.objects.select_for_update(skip_locked=True)
+        .filter(remove_at__lte=now())
+        .order_by("remove_at", "pk")
     )
-    expired_links_backup = list(expired_links)
-    deleted_count = expired_links.delete()[0]
+    if link_ids is not None:
+        links = links.filter(pk__in=link_ids)
+    if pk_range is not None:
+        links = links.filter(pk__range=pk_range)
+    if after is not None:
+        remove_at, pk = after
+        links = links.filter(
+            Q(remove_at__gt=remove_at) | Q(remove_at=remove_at, pk__gt=pk),
+        )
+    if limit is not None:
+        links = links[:limit]
+
+    with transaction.atomic():
+        expired_links = list(links)
+        if expired_links:
+            ShortenedLink.objects.filter(
+                pk__in=[link.pk for link in expired_links],
+            ).delete()
+    return expired_links
 
-    if deleted_count > 0:
-        user_links = defaultdict(list)
-        for link in expired_links_backup:
-            user_links[link.user].append(link)
 
-        for user, links in user_links.items():
+def notify_deleted_links(
+    links: list[ShortenedLink | DeletedLink],
+    **kwargs,
+) -> None:
+    """Sends one notification to each user listing their deleted links.
+
+    Args:
+        links: The deleted links.
+        **kwargs: Additional context data.
+    """
+    user_links = defaultdict(list)
+    for link in links:
+        user_links[link.user_id].append(link)
+    with NotificationWriter() as writer:
+        for user_id, user_deleted_links in user_links.items():
             send_notification_deleted_links(
-                user=user,
-                links=links,
+                user=user_id,
+                links=user_deleted_links,
+                writer=writer,
+                **kwargs,
+            )
+
+
+def notify_deleted_links_after_failure(
+    links: list[ShortenedLink | DeletedLink],
+    **kwargs,
+) -> None:
+    """Notifies the users of the links deleted before a task failed.
+
+    Notification errors are logged instead of raised, so the original failure
+    is the one that propagates and triggers the retry.
+
+    Args:
+        links: The links deleted before the failure.
+        **kwargs: Additional context data.
+    """
+    try:
+        notify_deleted_links(links, **kwargs)
+    except Exception:
+        logger.exception("Failed to notify the users of %d deleted links", len(links))
+
+
+@shared_task(**default_task_params("delete_expired_links", acks_late=True))
+def delete_expired_links(self, pk_range: list[int] | None = None) -> dict:
+    """Delete expired links from the database in chunks.
+
+    Each chunk of ``EXPIRED_LINKS_BATCH_SIZE`` links is committed on its own.
+    Once ``EXPIRED_LINKS_TIME_BUDGET`` seconds have passed, the users of the
+    links deleted so far are notified and the task re-enqueues itself for the
+    rest, so a backlog never runs into the task time limits. If a chunk
+    fails, the links already deleted are still notified before the task
+    retries.
+
+    Args:
+        pk_range: Only delete links with primary keys in this inclusive range,
+            when run as a partition by ``run_partitioned``.
+    """
+    deadline = time.monotonic() + EXPIRED_LINKS_TIME_BUDGET
+    deleted_links = []
+    last_key = None
+    rescheduled = False
+    try:
+        while True:
+            chunk = delete_due_links(
+                limit=EXPIRED_LINKS_BATCH_SIZE,
+                after=last_key,
+                pk_range=pk_range,
             )
+            deleted_links.extend(DeletedLink.from_link(link) for link in chunk)
+            if len(chunk) < EXPIRED_LINKS_BATCH_SIZE:
+                break
+            last_key = (chunk[-1].remove_at, chunk[-1].pk)
+            if time.monotonic() >= deadline:
+                rescheduled = True
+                break
+    except Exception:
+        notify_deleted_links_after_failure(deleted_links)
+        raise
+    notify_deleted_links(deleted_links)
+
+    if rescheduled:
+        delete_expired_links.delay(pk_range=pk_range)
     return task_response(
         "COMPLETED",
-        f"Deleted {deleted_count} expired links.",
-        deleted_count=deleted_count,
+        f"Deleted {len(deleted_links)} expired links.",
+        deleted_count=len(deleted_links),
+        rescheduled=rescheduled,
     )
 
 
-@shared_task(**default_task_params("delete_excess_user_links", acks_late=True))
-def delete_excess_user_links(self) -> dict:
-    """Delete excess links for users that have exceeded their link limit."""
-    users = User.objects.prefetch_related("shortened_links").all()
-    total_deleted_count = 0
-
-    for user in users:
-        links = user.shortened_links.order_by("-updated_at")
-        link_num = user.link_num["links"] - user.max_num_links
-        link_num_temp = user.link_num["temp_links"] - user.max_num_links_temporary
-        user_deleted_count = 0
-        deleted_links = []
-
-        if link_num > 0:
-            links_to_delete = links.filter(remove_at__isnull=True)[:link_num]
-            deleted_links.extend(list(links_to_delete))
-            deleted = links.filter(pk__in=links_to_delete).delete()[0]
-            user_deleted_count += deleted
-            total_deleted_count += deleted
-
-        if link_num_temp > 0:
-            temp_links_to_delete = links.filter(remove_at__isnull=False)[:link_num_temp]
-            deleted_links.extend(list(temp_links_to_delete))
-            deleted = links.filter(pk__in=temp_links_to_delete).delete()[0]
-            user_deleted_count += deleted
-            total_deleted_count += deleted
-
-        if user_deleted_count > 0:
-            send_notification_deleted_links(
-                user=user,
-                links=deleted_links,
-                need_upgrade=True,
-            )
+@shared_task(**default_task_params("delete_links_by_ids", acks_late=True))
+def delete_links_by_ids(self, link_ids: list[int]) -> dict:
+    """Delete the given links that are due.
+
+    Links made permanent or postponed since they were scheduled are skipped.
+    """
+    deleted_links = delete_due_links(link_ids=link_ids)
+    notify_deleted_links(deleted_links)
+    return task_response(
+        "COMPLETED",
+        f"Deleted {len(deleted_links)} of {len(link_ids)} links.",
+        deleted_count=len(deleted_links),
+    )
+
+
+def get_excess_links(
+    user_pk_range: list[int] | None = None,
+) -> QuerySet[ShortenedLink]:
+    """Returns the links of every user beyond their current limits.
+
+    Links are ranked per user and kind (permanent or temporary) from the most
+    recently updated, and those ranked past the user's limit for that kind
+    are excess. Only users whose counters exceed a limit are ranked.
+
+    Args:
+        user_pk_range: Only consider users with primary keys in this inclusive
+            range.
+    """
+    is_temporary = ExpressionWrapper(
+        Q(remove_at__isnull=False),
+        output_field=BooleanField(),
+    )
+    over_quota_users = User.objects.filter(
+        Q(links_count__gt=F("max_num_links"))
+        | Q(temp_links_count__gt=F("max_num_links_temporary")),
+    )
+    if user_pk_range is not None:
+        over_quota_users = over_quota_users.filter(pk__range=user_pk_range)
+    return (
+        ShortenedLink.objects.filter(user__in=over_quota_users)
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F("user_id"), is_temporary],
+                order_by=F("updated_at").desc(),
+            ),
+            limit=Case(
+                When(remove_at__isnull=True, then=F("user__max_num_links")),
+                default=F("user__max_num_links_temporary"),
+            ),
+        )
+        .filter(rank__gt=F("limit"))
+    )
 
+
+@shared_task(
+    **default_task_params(
+        "delete_excess_user_links",
+        priority=PRIORITY_LOW,
+        acks_late=True,
+    ),
+)
+def delete_excess_user_links(self, pk_range: list[int] | None = None) -> dict:
+    """Delete excess links for users that have exceeded their link limit.
+
+    The excess links of all users are found with one query and deleted in
+    chunks of ``EXPIRED_LINKS_BATCH_SIZE``, each committed on its own. Each
+    affected user gets one notification. If a chunk fails, the links already
+    deleted are still notified before the task retries.
+
+    Args:
+        pk_range: Only delete links of users with primary keys in this
+            inclusive range, when run as a partition by ``run_partitioned``.
+    """
+    excess_link_ids = list(get_excess_links(pk_range).values_list("pk", flat=True))
+    deleted_links = []
+    try:
+        for start in range(0, len(excess_link_ids), EXPIRED_LINKS_BATCH_SIZE):
+            chunk = excess_link_ids[start : start + EXPIRED_LINKS_BATCH_SIZE]
+            with transaction.atomic():
+                links = list(
+                    ShortenedLink.objects.select_for_update().filter(pk__in=chunk),
+                )
+                ShortenedLink.objects.filter(
+                    pk__in=[link.pk for link in links],
+                ).delete()
+            deleted_links.extend(DeletedLink.from_link(link) for link in links)
+    except Exception:
+        notify_deleted_links_after_failure(deleted_links, need_upgrade=True)
+        raise
+    notify_deleted_links(deleted_links, need_upgrade=True)
     return task_response(
         "COMPLETED",
-        f"Deleted {total_deleted_count} excess links for users.",
-        deleted_count=total_deleted_count,
+        f"Deleted {len(deleted_links)} excess links for users.",
+        deleted_count=len(deleted_links),
     )
 
 
@@ -134,3 +350,86 @@ def delete_link_by_id(self, link_id: int) -> dict:
             f"Link with ID {link_id} does not exist",
             deleted_count=0,
         )
+
+
+@shared_task(
+    **default_task_params("rebuild_link_filter", priority=PRIORITY_LOW, acks_late=True),
+)
+def rebuild_link_filter(self) -> dict:
+    """Rebuild the Bloom filter of existing shortened links."""
+    link_count = populate_link_filter()
+    return task_response(
+        "COMPLETED",
+        f"Rebuilt link filter with {link_count} links.",
+        link_count=link_count,
+        **get_link_filter_stats(),
+    )
+
+
+@shared_task(
+    **default_task_params("flush_link_clicks", priority=PRIORITY_HIGH, acks_late=True),
+)
+def flush_link_clicks(self) -> dict:
+    """Apply the clicks buffered in Redis to the links in bulk."""
+    batch_count = flush_clicks()
+    ClickBatch.objects.filter(
+        created_at__lt=now() - timedelta(days=1),
+    ).delete()
+    return task_response(
+        "COMPLETED",
+        f"Flushed {batch_count} click batches.",
+        batch_count=batch_count,
+    )
+
+
+@shared_task(**default_task_params("compact_link_clicks", acks_late=True))
+def compact_link_clicks(self) -> dict:
+    """Move the closed hourly click buckets from Redis to hourly rows."""
+    batch_count = compact_hourly_clicks()
+    return task_response(
+        "COMPLETED",
+        f"Compacted {batch_count} hourly click batches.",
+        batch_count=batch_count,
+    )
+
+
+@shared_task(
+    **default_task_params("rollup_link_clicks", priority=PRIORITY_LOW, acks_late=True),
+)
+def rollup_link_clicks(self) -> dict:
+    """Roll the hourly click rows up into daily rows and prune old hours."""
+    rolled_up_count, pruned_count = rollup_daily_clicks()
+    return task_response(
+        "COMPLETED",
+        f"Rolled up {rolled_up_count} daily rows, pruned {pruned_count} hourly rows.",
+        rolled_up_count=rolled_up_count,
+        pruned_count=pruned_count,
+    )
+
+
+@shared_task(**default_task_params("persist_link_unique_visitors", acks_late=True))
+def persist_link_unique_visitors(self) -> dict:
+    """Store the unique visitor estimates of recently clicked links."""
+    link_count = persist_unique_visitors()
+    return task_response(
+        "COMPLETED",
+        f"Updated unique visitors of {link_count} links.",
+        link_count=link_count,
+    )
+
+
+@shared_task(
+    **default_task_params(
+        "refill_link_shortcode_pool",
+        priority=PRIORITY_HIGH,
+        acks_late=True,
+    ),
+)
+def refill_link_shortcode_pool(self) -> dict:
+    """Top the pool of unused shortcodes up."""
+    added_count = refill_shortcode_pool()
+    return task_response(
+        "COMPLETED",
+        f"Added {added_count} shortcodes to the pool.",
+        added_count=added_count,
+    )
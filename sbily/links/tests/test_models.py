@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from sbily.links.models import ShortenedLink
+from sbily.users.models import User
+
+# save() runs in an atomic block, a savepoint inside the test's transaction.
+SAVEPOINT_QUERIES = 2
+
+# Redis side effects of saving and deleting links, so only DB queries are counted.
+REDIS_SIDE_EFFECTS = (
+    "sbily.links.models.discard_shortcodes",
+    "sbily.links.models.invalidate_links",
+    "sbily.links.models.schedule_expiration",
+    "sbily.links.signals.invalidate_links",
+    "sbily.links.signals.schedule_expiration",
+    "sbily.links.signals.forget_unique_visitors",
+)
+
+
+class LinkTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="user",
+            email="user@example.com",
+            password="password",  # noqa: S106
+        )
+        User.objects.filter(pk=cls.user.pk).update(max_num_links_temporary=5)
+
+    def setUp(self):
+        for target in REDIS_SIDE_EFFECTS:
+            self.enterContext(mock.patch(target))
+
+
+@mock.patch("sbily.links.models.add_link_to_filter")
+@mock.patch("sbily.links.models.allocate_shortcode", return_value="pooled")
+class ShortenedLinkSaveQueriesTests(LinkTestCase):
+    def get_link(self) -> ShortenedLink:
+        link = ShortenedLink.objects.create(
+            user_id=self.user.pk,
+            original_link="https://example.com",
+        )
+        return ShortenedLink.objects.get(pk=link.pk)
+
+    def test_create(self, allocate_shortcode, add_link_to_filter):
+        # Counter reservation and insert.
+        with self.assertNumQueries(2 + SAVEPOINT_QUERIES):
+            ShortenedLink.objects.create(
+                user=self.user,
+                original_link="https://example.com",
+            )
+
+    def test_rename(self, allocate_shortcode, add_link_to_filter):
+        link = self.get_link()
+        link.shortened_link = "renamed"
+        # Shortcode uniqueness check and update.
+        with self.assertNumQueries(2 + SAVEPOINT_QUERIES):
+            link.save()
+
+    def test_toggle_active(self, allocate_shortcode, add_link_to_filter):
+        link = self.get_link()
+        link.is_active = False
+        with self.assertNumQueries(1 + SAVEPOINT_QUERIES):
+            link.save(update_fields=["is_active"])
+
+    def test_make_temporary(self, allocate_shortcode, add_link_to_filter):
+        link = self.get_link()
+        link.remove_at = timezone.now() + timezone.timedelta(days=1)
+        # Counter move and update.
+        with self.assertNumQueries(2 + SAVEPOINT_QUERIES):
+            link.save()
+
+
+@mock.patch("sbily.links.models.add_link_to_filter")
+@mock.patch("sbily.links.models.allocate_shortcode", side_effect=["a", "b", "c"])
+class ShortenedLinkDeleteTests(LinkTestCase):
+    def create_links(self) -> None:
+        expires_at = timezone.now() + timezone.timedelta(days=1)
+        for remove_at in (None, None, expires_at):
+            ShortenedLink.objects.create(
+                user_id=self.user.pk,
+                original_link="https://example.com",
+                remove_at=remove_at,
+            )
+
+    def test_queryset_delete(self, allocate_shortcode, add_link_to_filter):
+        self.create_links()
+        with CaptureQueriesContext(connection) as context:
+            ShortenedLink.objects.all().delete()
+        user_updates = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith('UPDATE "users_user"')
+        ]
+        assert len(user_updates) == 1
+        self.user.refresh_from_db()
+        assert (self.user.links_count, self.user.temp_links_count) == (0, 0)
+
+    def test_instance_delete(self, allocate_shortcode, add_link_to_filter):
+        self.create_links()
+        ShortenedLink.objects.filter(remove_at__isnull=False).get().delete()
+        self.user.refresh_from_db()
+        assert (self.user.links_count, self.user.temp_links_count) == (2, 0)
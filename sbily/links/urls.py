@@ -5,6 +5,8 @@ from django.urls import path
 from . import views
 
 LINK_PREFIX = getattr(settings, "LINK_PREFIX", "")
+# Serve the read-only views asynchronously when running under ASGI.
+ASYNC_VIEWS = getattr(settings, "ASYNC_VIEWS", False)
 
 # URLs for managing individual links
 link_urlpatterns = [
@@ -17,16 +19,16 @@ link_urlpatterns = [
 # Main URL patterns
 urlpatterns = [
     # Core pages
-    path("", views.home, name="home"),
+    path("", views.ahome if ASYNC_VIEWS else views.home, name="home"),
     path("create_link/", views.create_link, name="create_link"),
     # Link redirection
     path(
         "{prefix}<str:shortened_link>/".format(prefix=LINK_PREFIX or ""),
-        views.redirect_link,
+        views.aredirect_link if ASYNC_VIEWS else views.redirect_link,
         name="redirect_link",
     ),
     # Include sub-patterns
-    path("links/", views.links, name="links"),
+    path("links/", views.alinks if ASYNC_VIEWS else views.links, name="links"),
     path("link/<str:shortened_link>/", include(link_urlpatterns)),
     path("handle_link_actions/", views.handle_link_actions, name="handle_link_actions"),
 ]
@@ -1,62 +1,71 @@
-from datetime import datetime
-
 from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
 from sbily.users.models import User
 
 
-def validate_link_creation(is_temporary: bool, user: User) -> None:  # noqa: FBT001
-    """Helper function to validate link creation permissions.
+def reserve_user_links(user_id: int, links: int = 0, temp_links: int = 0) -> None:
+    """Updates a user's link counters, reserving room for new links.
 
     Args:
-        is_temporary: Whether the link being created is temporary.
-        user: User instance to validate permissions for.
+        user_id: ID of the user creating or converting links.
+        links: Change in the number of permanent links.
+        temp_links: Change in the number of temporary links.
 
     Raises:
-        ValidationError: If user lacks required permissions.
+        ValidationError: If the user has reached the maximum number of links allowed
+        for their account.
     """
+    if not User.add_link_counts(user_id, links=links, temp_links=temp_links):
+        raise ValidationError(
+            _(
+                "You have reached the maximum number of links allowed for your "
+                "account. Please upgrade your account to create more links.",
+            ),
+            code="max_links_reached",
+        )
 
-    error_message = _(
-        "You have reached the maximum number of links allowed for your account. "
-        "Please upgrade your account to create more links.",
-    )
-    error_code = "max_links_reached"
 
-    if (is_temporary and not user.can_create_temporary_link()) or (
-        not is_temporary and not user.can_create_link()
-    ):
-        raise ValidationError(error_message, code=error_code)
+def count_user_links(*, temporary: bool) -> Coalesce:
+    """Returns a subquery counting the links (or temporary links) of each user."""
+    from .models import ShortenedLink
 
+    links = (
+        ShortenedLink.objects.filter(
+            user=OuterRef("pk"),
+            remove_at__isnull=not temporary,
+        )
+        .order_by()
+        .values("user")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(links), 0)
 
-def user_can_create_link(
-    link_id: int | None,
-    link_remove_at: datetime | None,
-    user: User,
-) -> None:
-    """Checks if the user can create a new link or modify an existing link's temporary
-    status according to their account permissions.
 
-    Args:
-        link_id: ID of existing link to modify, or None for new link.
-        link_remove_at: Removal datetime for temporary link, or None for permanent link.
-        user: User attempting to create/modify the link.
+def reconcile_user_link_counts() -> int:
+    """Recounts the link counters of users whose counters have drifted.
 
-    Raises:
-        ValidationError: If the user has reached the maximum number of links allowed
-        for their account.
+    Returns:
+        int: Number of users whose counters were repaired.
     """
-    if not link_id:
-        validate_link_creation(is_temporary=bool(link_remove_at), user=user)
-        return
-
-    try:
-        link = user.shortened_links.get(id=link_id)
-    except User.shortened_links.model.DoesNotExist:
-        validate_link_creation(is_temporary=bool(link_remove_at), user=user)
-        return
-
-    # Skip validation if temporary status is not changing
-    is_temporary_status_changed = bool(link_remove_at) != bool(link.remove_at)
-    if is_temporary_status_changed:
-        validate_link_creation(is_temporary=bool(link_remove_at), user=user)
+    return (
+        User.objects.annotate(
+            actual_links_count=count_user_links(temporary=False),
+            actual_temp_links_count=count_user_links(temporary=True),
+        )
+        .filter(
+            ~Q(links_count=F("actual_links_count"))
+            | ~Q(temp_links_count=F("actual_temp_links_count")),
+        )
+        .update(
+            links_count=count_user_links(temporary=False),
+            temp_links_count=count_user_links(temporary=True),
+        )
+    )
@@ -2,10 +2,12 @@
 
 import re
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.http import HttpRequest
 from django.shortcuts import redirect
 from django.shortcuts import render
@@ -14,7 +16,14 @@ from django.utils import timezone
 from sbily.utils.data import validate
 from sbily.utils.urls import redirect_with_params
 
+from .cache import aresolve_link
+from .cache import invalidate_links
+from .cache import resolve_link
 from .models import ShortenedLink
+from .stats import arecord_click
+from .stats import get_click_series
+from .stats import get_visitor_fingerprint
+from .stats import record_click
 
 LINK_BASE_URL = getattr(settings, "LINK_BASE_URL", None)
 LINK_REMOVE_AT_EXCLUDE = r".\d*[-+]\d{2}:\d{2}"
@@ -24,6 +33,15 @@ def home(request: HttpRequest):
     return render(request, "home.html", {"LINK_BASE_URL": LINK_BASE_URL})
 
 
+@transaction.non_atomic_requests
+async def ahome(request: HttpRequest):
+    return await sync_to_async(render)(
+        request,
+        "home.html",
+        {"LINK_BASE_URL": LINK_BASE_URL},
+    )
+
+
 def create_link(request: HttpRequest):
     if request.method != "POST":
         return render(request, "create_link.html", {"LINK_BASE_URL": LINK_BASE_URL})
@@ -67,12 +85,33 @@ def create_link(request: HttpRequest):
 
 def redirect_link(request: HttpRequest, shortened_link: str):
     try:
-        link = ShortenedLink.objects.get(shortened_link=shortened_link)
+        link = resolve_link(shortened_link)
+        if not link.is_functional():
+            messages.error(request, "Link is expired or deactivated")
+            if request.user.id == link.user_id:
+                return redirect("link", link.shortened_link)
+            return redirect("home")
+        record_click(link.pk, get_visitor_fingerprint(request))
+        return redirect(link.original_link)
+    except ShortenedLink.DoesNotExist:
+        messages.error(request, "Link not found")
+        return redirect("home")
+    except Exception as e:
+        messages.error(request, f"An error occurred: {e}")
+        return redirect("home")
+
+
+@transaction.non_atomic_requests
+async def aredirect_link(request: HttpRequest, shortened_link: str):
+    try:
+        link = await aresolve_link(shortened_link)
         if not link.is_functional():
             messages.error(request, "Link is expired or deactivated")
-            if request.user == link.user:
+            user = await request.auser()
+            if user.id == link.user_id:
                 return redirect("link", link.shortened_link)
             return redirect("home")
+        await arecord_click(link.pk, get_visitor_fingerprint(request))
         return redirect(link.original_link)
     except ShortenedLink.DoesNotExist:
         messages.error(request, "Link not found")
@@ -90,6 +129,15 @@ def links(request: HttpRequest):
     return render(request, "links.html", {"links": links})
 
 
+@login_required
+@transaction.non_atomic_requests
+async def alinks(request: HttpRequest):
+    user = await request.auser()
+    links = [link async for link in ShortenedLink.objects.filter(user=user)]
+
+    return await sync_to_async(render)(request, "links.html", {"links": links})
+
+
 @login_required
 def link(request: HttpRequest, shortened_link: str):
     try:
@@ -114,12 +162,17 @@ def link(request: HttpRequest, shortened_link: str):
             "",
             f"{timezone.localtime(link.remove_at)}",
         )
+        series = get_click_series(link)
         return render(
             request,
             "link.html",
             {
                 "link": link,
                 "link_remove_at": link_remove_at,
+                "click_series": [
+                    ("Clicks in the last 24 hours (UTC)", series["hourly"], "H:00"),
+                    ("Clicks in the last 30 days (UTC)", series["daily"], "M j"),
+                ],
                 "LINK_BASE_URL": LINK_BASE_URL,
             },
         )
@@ -242,6 +295,7 @@ def handle_link_actions(request: HttpRequest):
 
     try:
         if action in ("activate_selected", "deactivate_selected"):
+            invalidate_links(*shortened_links.values_list("shortened_link", flat=True))
             actions[action](is_active=action == "activate_selected")
         else:
             actions[action]()
@@ -0,0 +1,46 @@
+from django.conf import settings
+
+from .models import Notification
+
+NOTIFICATION_BATCH_SIZE = getattr(settings, "NOTIFICATION_BATCH_SIZE", 500)
+
+
+class NotificationWriter:
+    """Collects notifications and creates them with ``bulk_create``.
+
+    Notifications are written every ``batch_size`` additions and when the
+    writer is used as a context manager and exits without an error.
+
+    Example:
+        with NotificationWriter() as writer:
+            for user in users:
+                writer.add(user, "Title", "Content")
+    """
+
+    def __init__(self, batch_size: int = NOTIFICATION_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending: list[Notification] = []
+        self.created_count = 0
+
+    def __enter__(self) -> "NotificationWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+
+    def add(self, user, title: str, content: str, **kwargs) -> None:
+        """Queues a notification for ``user`` (a user or their ID)."""
+        user_field = "user_id" if isinstance(user, int) else "user"
+        self.pending.append(
+            Notification(title=title, content=content, **{user_field: user}, **kwargs),
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Creates the queued notifications."""
+        if self.pending:
+            Notification.objects.bulk_create(self.pending)
+            self.created_count += len(self.pending)
+            self.pending = []
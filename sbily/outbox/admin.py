@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from .models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("task_name", "args", "kwargs", "created_at")
+    list_filter = ("task_name", "created_at")
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sbily.outbox.utils import OUTBOX_BATCH_SIZE
+from sbily.outbox.utils import relay_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Relay the task dispatches written to the outbox to the Celery broker, "
+        "continuously unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help="Number of messages relayed per transaction.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.5,
+            help="Seconds to wait when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop once the outbox is empty.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        relayed_count = 0
+        while True:
+            relayed, sent = relay_outbox(batch_size)
+            relayed_count += relayed
+            if relayed:
+                self.stdout.write(f"Relayed {relayed} messages as {sent} tasks.")
+            if relayed < batch_size:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Relayed {relayed_count} outbox messages."),
+        )
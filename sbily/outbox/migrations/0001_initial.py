@@ -0,0 +1,29 @@
+# Generated by Django 5.1.8 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(help_text='Name of the task to run', max_length=255, verbose_name='Task Name')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='Args')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='Kwargs')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Outbox Message',
+                'verbose_name_plural': 'Outbox Messages',
+                'ordering': ['pk'],
+            },
+        ),
+    ]
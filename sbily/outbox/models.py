@@ -0,0 +1,28 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class OutboxMessage(models.Model):
+    """A Celery task dispatch waiting to be relayed to the broker."""
+
+    task_name = models.CharField(
+        _("Task Name"),
+        max_length=255,
+        help_text=_("Name of the task to run"),
+    )
+    args = models.JSONField(_("Args"), default=list, blank=True)
+    kwargs = models.JSONField(_("Kwargs"), default=dict, blank=True)
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Outbox Message")
+        verbose_name_plural = _("Outbox Messages")
+        ordering = ["pk"]
+
+    def __str__(self):
+        return f"{self.task_name} - {self.pk}"
+
+    @property
+    def task_id(self) -> str:
+        """Task ID sent to the broker, the same every time it is relayed."""
+        return f"outbox-{self.pk}"
@@ -0,0 +1,53 @@
+import time
+
+from celery import shared_task
+from django.conf import settings
+
+from sbily.utils.tasks import PRIORITY_HIGH
+from sbily.utils.tasks import QUEUE_INTERACTIVE
+from sbily.utils.tasks import default_task_params
+from sbily.utils.tasks import task_response
+
+from .utils import OUTBOX_BATCH_SIZE
+from .utils import pop_suppressed_count
+from .utils import relay_outbox as relay_outbox_batch
+
+# Seconds, below CELERY_TASK_SOFT_TIME_LIMIT
+OUTBOX_RELAY_TIME_BUDGET = getattr(settings, "OUTBOX_RELAY_TIME_BUDGET", 45)
+
+
+@shared_task(
+    **default_task_params(
+        "relay_outbox",
+        queue=QUEUE_INTERACTIVE,
+        priority=PRIORITY_HIGH,
+        acks_late=True,
+    ),
+)
+def relay_outbox(self) -> dict:
+    """Relay the outbox to the broker in batches of ``OUTBOX_BATCH_SIZE``.
+
+    Runs until the outbox is empty or ``OUTBOX_RELAY_TIME_BUDGET`` seconds
+    have passed. Beat runs it every minute as a fallback; the ``relay_outbox``
+    command relays continuously and sends the messages in the meantime.
+
+    The response also reports the duplicate dispatches discarded by
+    ``enqueue_task`` since the previous run.
+    """
+    deadline = time.monotonic() + OUTBOX_RELAY_TIME_BUDGET
+    relayed_count = sent_count = 0
+    while time.monotonic() < deadline:
+        relayed, sent = relay_outbox_batch(OUTBOX_BATCH_SIZE)
+        relayed_count += relayed
+        sent_count += sent
+        if relayed < OUTBOX_BATCH_SIZE:
+            break
+    suppressed_count = pop_suppressed_count()
+    return task_response(
+        "COMPLETED",
+        f"Relayed {relayed_count} outbox messages as {sent_count} tasks; "
+        f"{suppressed_count} duplicate dispatches were suppressed.",
+        relayed_count=relayed_count,
+        sent_count=sent_count,
+        suppressed_count=suppressed_count,
+    )
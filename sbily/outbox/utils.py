@@ -0,0 +1,148 @@
+import json
+import logging
+
+from celery import Task
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from redis import RedisError
+
+from sbily.utils.redis import get_redis_connection
+from sbily.utils.tasks import suppress_duplicate
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = getattr(settings, "OUTBOX_BATCH_SIZE", 100)
+# Number of dispatches discarded as duplicates since the relay last reported it.
+OUTBOX_SUPPRESSED_KEY = "outbox:suppressed"
+
+
+def enqueue_task(task: Task | str, *args, **kwargs) -> OutboxMessage:
+    """Writes a task dispatch to the outbox in the current transaction.
+
+    The task is sent to the broker by ``relay_outbox`` once the transaction
+    commits, and never if it rolls back. Unlike ``delay_on_commit``, the
+    request does not wait on the broker and the dispatch is not lost if the
+    broker is unavailable.
+
+    Dispatches of tasks declared with an ``idempotency_window`` are discarded
+    after the commit if they duplicate one within that window (see
+    ``discard_duplicate_dispatch``).
+
+    Args:
+        task: The task, or its name.
+        *args: Positional arguments of the task.
+        **kwargs: Keyword arguments of the task.
+
+    Returns:
+        OutboxMessage: The stored dispatch.
+    """
+    if isinstance(task, str):
+        task = current_app.tasks.get(task, task)
+    message = OutboxMessage.objects.create(
+        task_name=task.name if isinstance(task, Task) else task,
+        args=list(args),
+        kwargs=kwargs,
+    )
+    window = getattr(task, "idempotency_window", None)
+    if window:
+        transaction.on_commit(
+            lambda: discard_duplicate_dispatch(message, window),
+            robust=True,
+        )
+    return message
+
+
+def discard_duplicate_dispatch(message: OutboxMessage, window: int) -> bool:
+    """Deletes an outbox message that duplicates a dispatch within ``window``.
+
+    It runs once the message is committed, so a rolled back dispatch never
+    claims the idempotency key and suppresses the next one. If the relay sends
+    the message first, the task still suppresses the duplicate run itself.
+    Discarded dispatches are counted for the ``relay_outbox`` task to report.
+
+    Args:
+        message: The committed outbox message.
+        window: Seconds during which duplicates are discarded.
+
+    Returns:
+        bool: Whether the message was discarded.
+    """
+    if not suppress_duplicate(
+        f"{message.task_name}:enqueue",
+        *message.args,
+        *[message.kwargs[key] for key in sorted(message.kwargs)],
+        window=window,
+    ):
+        return False
+    deleted, _ = OutboxMessage.objects.filter(pk=message.pk).delete()
+    if not deleted:
+        return False
+    logger.info("Skipped a duplicate %s dispatch", message.task_name)
+    try:
+        get_redis_connection().incr(OUTBOX_SUPPRESSED_KEY)
+    except RedisError:
+        logger.exception("Failed to count a suppressed %s dispatch", message.task_name)
+    return True
+
+
+def pop_suppressed_count() -> int:
+    """Returns and resets the number of dispatches discarded as duplicates."""
+    pipe = get_redis_connection().pipeline()
+    pipe.get(OUTBOX_SUPPRESSED_KEY)
+    pipe.delete(OUTBOX_SUPPRESSED_KEY)
+    try:
+        count, _ = pipe.execute()
+    except RedisError:
+        logger.exception("Failed to read the suppressed dispatch count")
+        return 0
+    return int(count or 0)
+
+
+def relay_outbox(batch_size: int = OUTBOX_BATCH_SIZE) -> tuple[int, int]:
+    """Sends a batch of outbox messages to the broker.
+
+    Messages are locked with ``SKIP LOCKED``, so concurrent relays split the
+    work, and deleted in the same transaction once sent over one broker
+    connection. Messages in the batch for the same task and arguments are
+    sent once. If the relay stops before committing, the messages are sent
+    again with the same task ID, so delivery is at least once.
+
+    Args:
+        batch_size: Maximum number of messages to relay.
+
+    Returns:
+        tuple[int, int]: Number of messages relayed and of tasks sent.
+    """
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).order_by("pk")[
+                :batch_size
+            ],
+        )
+        relayed_ids = []
+        sent = set()
+        with current_app.producer_or_acquire() as producer:
+            for message in messages:
+                key = (
+                    message.task_name,
+                    json.dumps([message.args, message.kwargs], sort_keys=True),
+                )
+                if key not in sent:
+                    try:
+                        current_app.send_task(
+                            message.task_name,
+                            args=message.args,
+                            kwargs=message.kwargs,
+                            task_id=message.task_id,
+                            producer=producer,
+                        )
+                    except Exception:
+                        logger.exception("Failed to relay %s", message)
+                        break
+                    sent.add(key)
+                relayed_ids.append(message.pk)
+        OutboxMessage.objects.filter(pk__in=relayed_ids).delete()
+    return len(relayed_ids), len(sent)
@@ -0,0 +1,124 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import get_connection
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from sbily.users.utils.emails import EMAIL_QUEUE_BATCH_SIZE
+from sbily.users.utils.emails import send_email_batch
+
+SMTP_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Accepts and discards every message, speaking just enough SMTP."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 localhost SMTP sink")
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply("250 localhost")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.reply("250 OK")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the messages/sec of sending emails one connection at a time "
+        "and in batches over one connection, against a local SMTP sink."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=500,
+            help="Number of emails sent for each run.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=EMAIL_QUEUE_BATCH_SIZE,
+            help="Number of emails sent over each connection in batches.",
+        )
+
+    def handle(self, *args, **options):
+        with SMTPSink(("127.0.0.1", 0), SMTPSinkHandler) as sink:
+            threading.Thread(target=sink.serve_forever, daemon=True).start()
+            host, port = sink.server_address
+            self.connection_options = {
+                "backend": SMTP_BACKEND,
+                "host": host,
+                "port": port,
+                "use_tls": False,
+                "use_ssl": False,
+                "username": "",
+                "password": "",
+            }
+            runs = [
+                ("one per connection", self.run_unbatched),
+                ("batched", self.run_batched),
+            ]
+            results = {}
+            for name, run in runs:
+                results[name] = run(options["messages"], options["batch_size"])
+                self.stdout.write(f"{name}: {results[name]:.1f} messages/sec")
+            sink.shutdown()
+
+        speedup = results["batched"] / results["one per connection"]
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {speedup:.2f}x"))
+
+    def payload(self, number: int) -> dict:
+        return {
+            "subject": f"Benchmark {number}",
+            "body": "Benchmark email",
+            "html": "<p>Benchmark email</p>",
+            "to": [f"user{number}@example.com"],
+        }
+
+    def run_unbatched(self, messages: int, batch_size: int) -> float:
+        start = time.perf_counter()
+        for number in range(messages):
+            payload = self.payload(number)
+            send_mail(
+                subject=payload["subject"],
+                message=payload["body"],
+                from_email=None,
+                recipient_list=payload["to"],
+                html_message=payload["html"],
+                connection=get_connection(**self.connection_options),
+            )
+        return messages / (time.perf_counter() - start)
+
+    def run_batched(self, messages: int, batch_size: int) -> float:
+        payloads = [self.payload(number) for number in range(messages)]
+        start = time.perf_counter()
+        for offset in range(0, messages, batch_size):
+            failed = send_email_batch(
+                payloads[offset : offset + batch_size],
+                connection=get_connection(**self.connection_options),
+            )
+            if failed:
+                msg = f"Failed to send {len(failed)} emails"
+                raise CommandError(msg)
+        return messages / (time.perf_counter() - start)
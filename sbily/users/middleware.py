@@ -1,15 +1,32 @@
 from zoneinfo import ZoneInfo
 
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
 from django.utils import timezone
 
 
 class TimezoneMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        if tzname := request.session.get("user_timezone"):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.activate(request.session.get("user_timezone"))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.activate(await request.session.aget("user_timezone"))
+        return await self.get_response(request)
+
+    def activate(self, tzname: str | None) -> None:
+        if tzname:
             timezone.activate(ZoneInfo(tzname))
         else:
             timezone.deactivate()
-        return self.get_response(request)
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_alter_token_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='links_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of permanent links created by the user', verbose_name='number of links'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='temp_links_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of temporary links created by the user', verbose_name='number of temporary links'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.8 on 2026-10-18 19:05
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_link_counts(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    ShortenedLink = apps.get_model("links", "ShortenedLink")
+
+    def count_links(temporary):
+        links = (
+            ShortenedLink.objects.filter(
+                user=OuterRef("pk"),
+                remove_at__isnull=not temporary,
+            )
+            .order_by()
+            .values("user")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return Coalesce(Subquery(links), 0)
+
+    User.objects.update(
+        links_count=count_links(False),
+        temp_links_count=count_links(True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0012_shortcode_sequence'),
+        ('users', '0015_user_link_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_link_counts, migrations.RunPython.noop),
+    ]
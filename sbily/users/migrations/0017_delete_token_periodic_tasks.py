@@ -0,0 +1,20 @@
+# Generated by Django 5.1.8 on 2026-10-18 19:40
+
+from django.db import migrations
+
+
+def delete_token_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name__startswith="Delete token").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('users', '0016_populate_user_link_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_token_tasks, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,21 @@
-import json
 from urllib.parse import urljoin
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Greatest
 from django.urls import reverse
 from django.utils.timezone import datetime
 from django.utils.timezone import now
 from django.utils.timezone import timedelta
 from django.utils.translation import gettext_lazy as _
-from django_celery_beat.models import ClockedSchedule
-from django_celery_beat.models import PeriodicTask
+
+from sbily.utils.expiry import schedule_expiration
 
 from .utils.data import generate_token
+from .utils.tokens import STATELESS_TOKENS
+from .utils.tokens import make_signed_token
 
 BASE_URL = settings.BASE_URL or ""
 
@@ -62,6 +64,22 @@ class User(AbstractUser):
         default=MAX_NUM_LINKS_TEMP_PER_USER,
         help_text=_("Maximum number of temporary links a user can create"),
     )
+    links_count = models.PositiveIntegerField(
+        _("number of links"),
+        default=0,
+        editable=False,
+        help_text=_("Number of permanent links created by the user"),
+    )
+    temp_links_count = models.PositiveIntegerField(
+        _("number of temporary links"),
+        default=0,
+        editable=False,
+        help_text=_("Number of temporary links created by the user"),
+    )
+
+    # Only ever changed with add_link_counts, so a full save never overwrites
+    # concurrent updates with stale values.
+    LINK_COUNTER_FIELDS = ("links_count", "temp_links_count")
 
     @property
     def is_admin(self) -> bool:
@@ -78,10 +96,7 @@ class User(AbstractUser):
     @property
     def link_num(self) -> dict[str, int]:
         """Returns the number of links and temporary links created by user"""
-        shortened_links = self.shortened_links.all()
-        links = shortened_links.filter(remove_at__isnull=True).count()
-        temp_links = shortened_links.filter(remove_at__isnull=False).count()
-        return {"links": links, "temp_links": temp_links}
+        return {"links": self.links_count, "temp_links": self.temp_links_count}
 
     @property
     def link_num_left(self) -> dict[str, int]:
@@ -112,8 +127,56 @@ class User(AbstractUser):
         if self.role in role_limits:
             self.max_num_links, self.max_num_links_temporary = role_limits[self.role]
 
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LINK_COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
+    @classmethod
+    def add_link_counts(cls, user_id: int, links: int = 0, temp_links: int = 0) -> bool:
+        """Atomically adds to a user's link counters, within the user's limits.
+
+        Increments are reserved with a single conditional ``UPDATE``, so
+        concurrent link creations can never exceed ``max_num_links`` or
+        ``max_num_links_temporary``. Run inside a transaction, the
+        reservation is released if it rolls back.
+
+        Args:
+            user_id: ID of the user to update
+            links: Change in the number of permanent links
+            temp_links: Change in the number of temporary links
+
+        Returns:
+            bool: False if an increment would exceed the user's limits, in
+            which case nothing is changed.
+        """
+        if not links and not temp_links:
+            return True
+
+        users = cls.objects.filter(pk=user_id)
+        if links > 0:
+            users = users.filter(
+                links_count__lte=models.F("max_num_links") - links,
+            )
+        if temp_links > 0:
+            users = users.filter(
+                temp_links_count__lte=models.F("max_num_links_temporary") - temp_links,
+            )
+        # Decrements are clamped at zero so drift never breaks deletes; see the
+        # reconcile_link_counts command.
+        return bool(
+            users.update(
+                links_count=Greatest(models.F("links_count") + links, 0),
+                temp_links_count=Greatest(
+                    models.F("temp_links_count") + temp_links,
+                    0,
+                ),
+            ),
+        )
+
     def can_create_link(self) -> bool:
         """Check if user can create links"""
         return self.link_num_left["links"] > 0
@@ -137,6 +200,9 @@ class User(AbstractUser):
     ) -> str:
         """Gets a token of the given type.
 
+        With ``STATELESS_TOKENS``, a signed token is returned without writing
+        to the database, unless a custom ``expires_at`` is given.
+
         Args:
             token_type: Type of token to get/create
             expires_at: Optional expiry time for the token
@@ -150,6 +216,8 @@ class User(AbstractUser):
         if token_type not in dict(Token.TOKEN_TYPE):
             msg = f"Invalid token type: {token_type}"
             raise ValueError(msg)
+        if STATELESS_TOKENS and expires_at is None:
+            return make_signed_token(self, token_type)
 
         token = self.tokens.filter(type=token_type).first() or self.tokens.create(
             type=token_type,
@@ -287,21 +355,7 @@ class Token(models.Model):
         super().full_clean()
         super().save(*args, **kwargs)
 
-        schedule, _ = ClockedSchedule.objects.get_or_create(
-            clocked_time=self.expires_at,
-        )
-        PeriodicTask.objects.update_or_create(
-            name=f"Delete token {self.id}",
-            defaults={
-                "task": "delete_token_by_id",
-                "args": json.dumps([self.pk]),
-                "clocked": schedule,
-                "one_off": True,
-                "expires": self.expires_at + timedelta(minutes=1),
-                "start_time": self.expires_at,
-                "enabled": True,
-            },
-        )
+        schedule_expiration("token", self.pk, self.expires_at)
 
     def renew(self):
         """Renew token by updating token and timestamps"""
@@ -1,18 +1,38 @@
+import time
+
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from django.conf import settings
 from django.utils import timezone
+from redis.exceptions import LockError
 
+from sbily.utils.redis import get_redis_connection
+from sbily.utils.tasks import PRIORITY_HIGH
+from sbily.utils.tasks import PRIORITY_LOW
+from sbily.utils.tasks import QUEUE_INTERACTIVE
 from sbily.utils.tasks import default_task_params
+from sbily.utils.tasks import suppress_duplicate_run
 from sbily.utils.tasks import task_response
 
 from .models import Token
 from .models import User
+from .utils.emails import EMAIL_QUEUE_BATCH_SIZE
+from .utils.emails import EMAIL_QUEUE_LOCK_KEY
+from .utils.emails import requeue_processing_emails
 from .utils.emails import send_email
+from .utils.emails import send_queued_email_batch
 
 logger = get_task_logger(__name__)
 
+# Seconds, below CELERY_TASK_SOFT_TIME_LIMIT
+EMAIL_QUEUE_TIME_BUDGET = getattr(settings, "EMAIL_QUEUE_TIME_BUDGET", 45)
+EMAIL_IDEMPOTENCY_WINDOW = getattr(settings, "EMAIL_IDEMPOTENCY_WINDOW", 60)
+EMAIL_TASK_RATE_LIMIT = getattr(settings, "EMAIL_TASK_RATE_LIMIT", "20/s")
+# Held while draining the queue; expires once a killed worker hits the hard limit
+EMAIL_QUEUE_LOCK_TIMEOUT = getattr(settings, "CELERY_TASK_TIME_LIMIT", 5 * 60)
+
 
-@shared_task(**default_task_params("send_welcome_email"))
+@shared_task(**default_task_params("send_welcome_email", queue=QUEUE_INTERACTIVE))
 def send_welcome_email(self, user_id: int):
     """
     Send a welcome email to a newly registered user.
@@ -33,14 +53,29 @@ def send_welcome_email(self, user_id: int):
 
     return task_response(
         "COMPLETED",
-        f"Welcome email sent to {user.username}.",
+        f"Welcome email queued for {user.username}.",
         user_id=user_id,
     )
 
 
-@shared_task(**default_task_params("send_email_verification"))
+@shared_task(
+    **default_task_params(
+        "send_email_verification",
+        queue=QUEUE_INTERACTIVE,
+        priority=PRIORITY_HIGH,
+        rate_limit=EMAIL_TASK_RATE_LIMIT,
+        idempotency_window=EMAIL_IDEMPOTENCY_WINDOW,
+    ),
+)
 def send_email_verification(self, user_id: int):
     """Send email verification link to user."""
+    if response := suppress_duplicate_run(
+        self,
+        user_id,
+        window=EMAIL_IDEMPOTENCY_WINDOW,
+    ):
+        return response
+
     user = User.objects.get(id=user_id)
 
     subject = "Verify your email address"
@@ -54,14 +89,29 @@ def send_email_verification(self, user_id: int):
     )
     return task_response(
         "COMPLETED",
-        f"Verification email sent to {user.username}.",
+        f"Verification email queued for {user.username}.",
         user_id=user_id,
     )
 
 
-@shared_task(**default_task_params("send_password_reset_email"))
+@shared_task(
+    **default_task_params(
+        "send_password_reset_email",
+        queue=QUEUE_INTERACTIVE,
+        priority=PRIORITY_HIGH,
+        rate_limit=EMAIL_TASK_RATE_LIMIT,
+        idempotency_window=EMAIL_IDEMPOTENCY_WINDOW,
+    ),
+)
 def send_password_reset_email(self, user_id: int):
     """Send password reset link to user."""
+    if response := suppress_duplicate_run(
+        self,
+        user_id,
+        window=EMAIL_IDEMPOTENCY_WINDOW,
+    ):
+        return response
+
     user = User.objects.get(id=user_id)
 
     subject = "Reset your password"
@@ -75,12 +125,14 @@ def send_password_reset_email(self, user_id: int):
     )
     return task_response(
         "COMPLETED",
-        f"Password reset email sent to {user.username}.",
+        f"Password reset email queued for {user.username}.",
         user_id=user_id,
     )
 
 
-@shared_task(**default_task_params("send_password_changed_email"))
+@shared_task(
+    **default_task_params("send_password_changed_email", queue=QUEUE_INTERACTIVE),
+)
 def send_password_changed_email(self, user_id: int):
     """Send email informing user that their password has been changed."""
     user = User.objects.get(id=user_id)
@@ -91,14 +143,29 @@ def send_password_changed_email(self, user_id: int):
     user.email_user(subject, template)
     return task_response(
         "COMPLETED",
-        f"Password changed email sent to {user.username}.",
+        f"Password changed email queued for {user.username}.",
         user_id=user_id,
     )
 
 
-@shared_task(**default_task_params("send_email_change_instructions"))
+@shared_task(
+    **default_task_params(
+        "send_email_change_instructions",
+        queue=QUEUE_INTERACTIVE,
+        priority=PRIORITY_HIGH,
+        rate_limit=EMAIL_TASK_RATE_LIMIT,
+        idempotency_window=EMAIL_IDEMPOTENCY_WINDOW,
+    ),
+)
 def send_email_change_instructions(self, user_id: int):
     """Send email change instructions to user."""
+    if response := suppress_duplicate_run(
+        self,
+        user_id,
+        window=EMAIL_IDEMPOTENCY_WINDOW,
+    ):
+        return response
+
     user = User.objects.get(id=user_id)
 
     subject = "Change your email address"
@@ -112,12 +179,12 @@ def send_email_change_instructions(self, user_id: int):
     )
     return task_response(
         "COMPLETED",
-        f"Email change instructions sent to {user.username}.",
+        f"Email change instructions queued for {user.username}.",
         user_id=user_id,
     )
 
 
-@shared_task(**default_task_params("send_email_changed_email"))
+@shared_task(**default_task_params("send_email_changed_email", queue=QUEUE_INTERACTIVE))
 def send_email_changed_email(self, user_id: int, old_email: str):
     """Send email informing user that their email has been changed."""
     user = User.objects.get(id=user_id)
@@ -139,12 +206,14 @@ def send_email_changed_email(self, user_id: int, old_email: str):
 
     return task_response(
         "COMPLETED",
-        f"Email changed email sent to {user.username}.",
+        f"Email changed email queued for {user.username}.",
         user_id=user_id,
     )
 
 
-@shared_task(**default_task_params("send_deleted_account_email"))
+@shared_task(
+    **default_task_params("send_deleted_account_email", queue=QUEUE_INTERACTIVE),
+)
 def send_deleted_account_email(self, user_email: int, username: str):
     """Send email informing user that their account has been deleted."""
     subject = "Your account has been deleted"
@@ -153,15 +222,28 @@ def send_deleted_account_email(self, user_email: int, username: str):
     send_email(subject, template, [user_email], username=username, name=username)
     return task_response(
         "COMPLETED",
-        f"Account deleted email sent to {user_email}.",
+        f"Account deleted email queued for {user_email}.",
         user_email=user_email,
     )
 
 
-@shared_task(**default_task_params("cleanup_expired_tokens", acks_late=True))
-def cleanup_expired_tokens(self):
-    """Delete expired tokens from database."""
+@shared_task(
+    **default_task_params(
+        "cleanup_expired_tokens",
+        priority=PRIORITY_LOW,
+        acks_late=True,
+    ),
+)
+def cleanup_expired_tokens(self, pk_range: list[int] | None = None):
+    """Delete expired tokens from database.
+
+    Args:
+        pk_range: Only delete tokens with primary keys in this inclusive range,
+            when run as a partition by ``run_partitioned``.
+    """
     tokens = Token.objects.select_for_update().filter(expires_at__lt=timezone.now())
+    if pk_range is not None:
+        tokens = tokens.filter(pk__range=pk_range)
     num_deleted = tokens.delete()[0]
     return task_response(
         "COMPLETED",
@@ -180,3 +262,68 @@ def delete_token_by_id(self, token_id: int) -> dict:
         "COMPLETED",
         f"Successfully deleted token with ID {token_id}",
     )
+
+
+@shared_task(**default_task_params("delete_tokens_by_ids", acks_late=True))
+def delete_tokens_by_ids(self, token_ids: list[int]) -> dict:
+    """Delete the given tokens that have expired.
+
+    Tokens renewed since they were scheduled are skipped.
+    """
+    num_deleted = Token.objects.filter(
+        pk__in=token_ids,
+        expires_at__lte=timezone.now(),
+    ).delete()[0]
+    return task_response(
+        "COMPLETED",
+        f"Deleted {num_deleted} of {len(token_ids)} tokens.",
+        num_deleted=num_deleted,
+    )
+
+
+@shared_task(
+    **default_task_params(
+        "send_queued_emails",
+        queue=QUEUE_INTERACTIVE,
+        priority=PRIORITY_HIGH,
+        acks_late=True,
+    ),
+)
+def send_queued_emails(self) -> dict:
+    """Send the queued emails in batches of ``EMAIL_QUEUE_BATCH_SIZE``.
+
+    Each batch is sent over one connection to the email backend. The queue
+    is drained until it is empty, a whole batch fails or
+    ``EMAIL_QUEUE_TIME_BUDGET`` seconds have passed. Only one run drains the
+    queue at a time; it first requeues the emails a crashed run left in the
+    processing list.
+    """
+    lock = get_redis_connection().lock(
+        EMAIL_QUEUE_LOCK_KEY,
+        timeout=EMAIL_QUEUE_LOCK_TIMEOUT,
+    )
+    if not lock.acquire(blocking=False):
+        return task_response("SKIPPED", "The email queue is already being sent.")
+
+    sent_count = failed_count = 0
+    try:
+        requeued_count = requeue_processing_emails()
+        deadline = time.monotonic() + EMAIL_QUEUE_TIME_BUDGET
+        while time.monotonic() < deadline:
+            sent, failed = send_queued_email_batch(EMAIL_QUEUE_BATCH_SIZE)
+            sent_count += sent
+            failed_count += failed
+            if sent + failed < EMAIL_QUEUE_BATCH_SIZE or not sent:
+                break
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("The email queue lock expired before it was released")
+    return task_response(
+        "COMPLETED",
+        f"Sent {sent_count} queued emails, {failed_count} failed.",
+        sent_count=sent_count,
+        failed_count=failed_count,
+        requeued_count=requeued_count,
+    )
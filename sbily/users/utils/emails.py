@@ -1,11 +1,153 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail import get_connection
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
+from redis import RedisError
 
 from sbily.users.models import User
+from sbily.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+EMAIL_QUEUE_KEY = "emails:queue"
+# Emails taken from the queue and not sent yet; only one worker drains the
+# queue at a time, holding EMAIL_QUEUE_LOCK_KEY.
+EMAIL_PROCESSING_KEY = "emails:processing"
+EMAIL_QUEUE_LOCK_KEY = "emails:queue:lock"
+EMAIL_QUEUE_BATCH_SIZE = getattr(settings, "EMAIL_QUEUE_BATCH_SIZE", 100)
+EMAIL_MAX_ATTEMPTS = getattr(settings, "EMAIL_MAX_ATTEMPTS", 5)
+
+
+def build_email_message(payload: dict) -> EmailMultiAlternatives:
+    """Builds the email message of a payload stored in the queue."""
+    message = EmailMultiAlternatives(
+        subject=payload["subject"],
+        body=payload["body"],
+        from_email=payload.get("from_email"),
+        to=payload["to"],
+    )
+    if payload.get("html"):
+        message.attach_alternative(payload["html"], "text/html")
+    return message
+
+
+def queue_emails(payloads: list[dict]) -> None:
+    """Appends rendered emails to the queue drained by ``send_queued_emails``.
+
+    Args:
+        payloads: Dicts with the ``subject``, ``body``, ``to`` and optionally
+            ``html``, ``from_email`` and ``attempts`` of each email.
+    """
+    if payloads:
+        get_redis_connection().rpush(
+            EMAIL_QUEUE_KEY,
+            *[json.dumps(payload) for payload in payloads],
+        )
+
+
+def send_email_batch(payloads: list[dict], connection=None) -> list[dict]:
+    """Sends emails over a single connection to the email backend.
+
+    The connection is opened once for the whole batch. Each message is handed
+    to ``send_messages`` on that connection on its own, so a rejected message
+    is known and does not stop the rest of the batch.
+
+    Args:
+        payloads: Emails to send, as stored in the queue.
+        connection: Email backend to use; ``get_connection()`` by default.
+
+    Returns:
+        list[dict]: The payloads that could not be sent.
+    """
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception:
+        logger.exception("Failed to connect to the email backend")
+        return payloads
+
+    failed = []
+    try:
+        for payload in payloads:
+            try:
+                connection.send_messages([build_email_message(payload)])
+            except Exception:
+                logger.exception("Failed to send email to %s", payload["to"])
+                failed.append(payload)
+    finally:
+        connection.close()
+    return failed
+
+
+def requeue_processing_emails() -> int:
+    """Puts the emails left in the processing list back at the queue's head.
+
+    They were taken by a worker that stopped before finishing its batch, so
+    some of them may already have been sent and will be sent again.
+
+    Returns:
+        int: Number of emails requeued.
+    """
+    redis = get_redis_connection()
+    count = 0
+    while redis.lmove(EMAIL_PROCESSING_KEY, EMAIL_QUEUE_KEY, "RIGHT", "LEFT"):
+        count += 1
+    if count:
+        logger.warning("Requeued %s emails left unsent by a stopped worker", count)
+    return count
+
+
+def send_queued_email_batch(
+    batch_size: int = EMAIL_QUEUE_BATCH_SIZE,
+) -> tuple[int, int]:
+    """Sends one batch of queued emails.
+
+    The batch is moved to a processing list and only removed from it once
+    sent, so a worker crash does not lose it (see
+    ``requeue_processing_emails``). Emails that fail are put back at the end
+    of the queue, up to ``EMAIL_MAX_ATTEMPTS`` attempts each, after which
+    they are dropped.
+
+    Returns:
+        tuple[int, int]: Number of emails sent and of emails that failed.
+    """
+    redis = get_redis_connection()
+    with redis.pipeline(transaction=False) as pipe:
+        for _ in range(batch_size):
+            pipe.lmove(EMAIL_QUEUE_KEY, EMAIL_PROCESSING_KEY, "LEFT", "RIGHT")
+        payloads = [json.loads(raw) for raw in pipe.execute() if raw is not None]
+    if not payloads:
+        return 0, 0
+
+    failed = send_email_batch(payloads)
+    retries = []
+    for payload in failed:
+        payload["attempts"] = payload.get("attempts", 0) + 1
+        if payload["attempts"] < EMAIL_MAX_ATTEMPTS:
+            retries.append(payload)
+        else:
+            logger.error(
+                "Dropping email to %s after %s attempts",
+                payload["to"],
+                payload["attempts"],
+            )
+    with redis.pipeline() as pipe:
+        pipe.delete(EMAIL_PROCESSING_KEY)
+        if retries:
+            pipe.rpush(EMAIL_QUEUE_KEY, *[json.dumps(payload) for payload in retries])
+        pipe.execute()
+    return len(payloads) - len(failed), len(failed)
 
 
 def send_email(subject: str, template: str, recipient_list: list[str], **kwargs):
-    """Send an email to a list of recipients.
+    """Queue an email to a list of recipients.
+
+    The email is rendered now and sent by the ``send_queued_emails`` task. If
+    the queue is unavailable, it is sent right away instead.
 
     Args:
         subject: Email subject line.
@@ -16,14 +158,24 @@ def send_email(subject: str, template: str, recipient_list: list[str], **kwargs)
 
     message = render_to_string(template, kwargs)
 
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=None,
-        recipient_list=recipient_list,
-        fail_silently=False,
-        html_message=message,
-    )
+    payload = {
+        "subject": subject,
+        "body": message,
+        "html": message,
+        "to": recipient_list,
+    }
+    try:
+        queue_emails([payload])
+    except RedisError:
+        logger.exception("Failed to queue email, sending it directly")
+        send_mail(
+            subject=subject,
+            message=message,
+            from_email=None,
+            recipient_list=recipient_list,
+            fail_silently=False,
+            html_message=message,
+        )
 
 
 def send_email_to_user(user: User, subject: str, template: str, **kwargs):
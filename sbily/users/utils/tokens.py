@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core import signing
+
+if TYPE_CHECKING:
+    from sbily.users.models import Token
+    from sbily.users.models import User
+
+# Sign links with a TimestampSigner instead of storing a Token row.
+STATELESS_TOKENS = getattr(settings, "STATELESS_TOKENS", True)
+SIGNED_TOKEN_SALT = "sbily.users.tokens"  # noqa: S105
+SIGNED_TOKEN_SEP = ":"  # noqa: S105
+
+
+@dataclass
+class UserToken:
+    """A verified token and the user it was issued to.
+
+    Args:
+        user: User the token belongs to.
+        token: The stored token, or None for a signed token.
+        expired: Whether the token has expired.
+    """
+
+    user: "User"
+    token: "Token | None" = None
+    expired: bool = False
+
+    def is_expired(self) -> bool:
+        return self.expired
+
+    def delete(self) -> None:
+        """Deletes the stored token; signed tokens are invalidated by use."""
+        if self.token is not None:
+            self.token.delete()
+
+
+def get_token_signer(user: "User", token_type: str) -> signing.TimestampSigner:
+    """Returns the signer of the tokens of a type for a user.
+
+    The salt includes the user state that using any token changes (password,
+    email, verification, last login), so a signed token stops working once
+    it has been used, without being stored.
+    """
+    last_login = user.last_login.replace(microsecond=0) if user.last_login else ""
+    state = ":".join(
+        [
+            str(user.pk),
+            user.password,
+            user.email,
+            str(user.email_verified),
+            str(user.login_with_email),
+            str(last_login),
+        ],
+    )
+    return signing.TimestampSigner(
+        sep=SIGNED_TOKEN_SEP,
+        salt=f"{SIGNED_TOKEN_SALT}:{token_type}:{state}",
+    )
+
+
+def make_signed_token(user: "User", token_type: str) -> str:
+    """Returns a signed token of the given type for a user."""
+    return get_token_signer(user, token_type).sign(str(user.pk))
+
+
+def get_user_token(
+    token: str,
+    token_type: str,
+    user: "User | None" = None,
+) -> UserToken:
+    """Verifies a token of the given type.
+
+    Signed tokens only cost the lookup of their user (none if ``user`` is
+    given); tokens without a signature are looked up in the ``Token`` table.
+
+    Args:
+        token: The token from the link.
+        token_type: Expected type of the token.
+        user: Only accept tokens issued to this user.
+
+    Returns:
+        UserToken: The verified token.
+
+    Raises:
+        Token.DoesNotExist: If the token is invalid.
+    """
+    from sbily.users.models import Token
+    from sbily.users.models import User
+
+    if SIGNED_TOKEN_SEP not in token:
+        tokens = Token.objects.select_related("user")
+        if user is not None:
+            tokens = tokens.filter(user=user)
+        obj_token = tokens.get(token=token, type=token_type)
+        return UserToken(obj_token.user, obj_token, bool(obj_token.is_expired()))
+
+    user_id = token.split(SIGNED_TOKEN_SEP, 1)[0]
+    if not user_id.isdigit() or (user is not None and str(user.pk) != user_id):
+        raise Token.DoesNotExist
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            raise Token.DoesNotExist
+
+    try:
+        get_token_signer(user, token_type).unsign(
+            token,
+            max_age=Token.DEFAULT_EXPIRY,
+        )
+    except signing.SignatureExpired:
+        return UserToken(user, expired=True)
+    except signing.BadSignature:
+        raise Token.DoesNotExist from None
+    return UserToken(user)
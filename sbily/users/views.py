@@ -6,6 +6,7 @@ from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.shortcuts import render
 
+from sbily.outbox.utils import enqueue_task
 from sbily.users.models import Token
 from sbily.users.models import User
 from sbily.users.tasks import send_deleted_account_email
@@ -13,6 +14,7 @@ from sbily.users.tasks import send_email_change_instructions
 from sbily.users.tasks import send_email_changed_email
 from sbily.users.tasks import send_email_verification
 from sbily.users.tasks import send_password_changed_email
+from sbily.users.utils.tokens import get_user_token
 from sbily.utils.data import validate
 from sbily.utils.data import validate_password
 from sbily.utils.errors import BadRequestError
@@ -57,7 +59,7 @@ def change_email_instructions(request: HttpRequest):
         user = request.user
         if not user.email_verified:
             bad_request_error("Please verify your email first")
-        send_email_change_instructions.delay_on_commit(user.id)
+        enqueue_task(send_email_change_instructions, user.id)
         messages.success(request, "Please check your email for instructions")
         return redirect_with_tab("email")
     except BadRequestError as e:
@@ -71,11 +73,7 @@ def change_email_instructions(request: HttpRequest):
 @login_required
 def change_email(request: HttpRequest, token: str):
     try:
-        token_obj = Token.objects.get(
-            token=token,
-            type=Token.TYPE_CHANGE_EMAIL,
-            user=request.user,
-        )
+        token_obj = get_user_token(token, Token.TYPE_CHANGE_EMAIL, user=request.user)
 
         if request.method != "POST":
             return redirect_with_tab("email", token=token)
@@ -99,7 +97,7 @@ def change_email(request: HttpRequest, token: str):
         user.save()
         token_obj.delete()
 
-        send_email_changed_email.delay_on_commit(user.id, old_email)
+        enqueue_task(send_email_changed_email, user.id, old_email)
 
         messages.success(
             request,
@@ -165,7 +163,7 @@ def change_password(request: HttpRequest):
 
         user.set_password(new_password)
         user.save()
-        send_password_changed_email.delay_on_commit(request.user.id)
+        enqueue_task(send_password_changed_email, request.user.id)
         messages.success(request, "Successful updated password! Please re-login")
         return redirect_with_tab("security")
     except BadRequestError as e:
@@ -182,7 +180,7 @@ def resend_verify_email(request: HttpRequest):
         user = request.user
         if user.email_verified:
             bad_request_error("Email has already been verified")
-        send_email_verification.delay_on_commit(user.id)
+        enqueue_task(send_email_verification, user.id)
         messages.success(request, "Verification email sent successfully")
         return redirect_with_tab("email")
     except BadRequestError as e:
@@ -212,7 +210,7 @@ def delete_account(request: HttpRequest):
             bad_request_error("Incorrect username or password")
 
         user_email = user.email
-        send_deleted_account_email.delay_on_commit(user_email, username)
+        enqueue_task(send_deleted_account_email, user_email, username)
         user.delete()
         messages.success(request, "Account deleted successfully")
         return redirect("sign_in")
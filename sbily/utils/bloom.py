@@ -0,0 +1,154 @@
+import hashlib
+import math
+from collections.abc import Iterable
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+# Sets the given bits only if the filter already exists, so incremental adds
+# never create a partial filter that would answer false negatives. Bits are
+# also set on a filter being rebuilt, so the add survives the swap.
+ADD_SCRIPT = """
+if redis.call("EXISTS", KEYS[3]) == 1 then
+    redis.call("BITFIELD", KEYS[3], unpack(ARGV))
+end
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+redis.call("BITFIELD", KEYS[1], unpack(ARGV))
+redis.call("INCR", KEYS[2])
+return 1
+"""
+
+
+class RedisBloomFilter:
+    """Bloom filter stored as a Redis bitmap, shared by every process.
+
+    A negative answer is definite, while a positive answer may be a false
+    positive with probability close to ``error_rate`` as long as the filter
+    holds at most ``capacity`` items. Items cannot be removed; stale entries
+    only cost false positives until the next rebuild.
+
+    Args:
+        connection: Redis client used to store the filter.
+        key: Redis key of the bitmap.
+        capacity: Expected number of items in the filter.
+        error_rate: Target false positive probability at capacity.
+    """
+
+    REBUILD_CHUNK_SIZE = 1000
+
+    def __init__(
+        self,
+        connection: Redis,
+        key: str,
+        capacity: int,
+        error_rate: float,
+    ) -> None:
+        self.connection = connection
+        self.key = key
+        self.count_key = f"{key}:count"
+        self.rebuild_key = f"{key}:rebuild"
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._add_script = connection.register_script(ADD_SCRIPT)
+
+    def _positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _set_args(self, item: str) -> list[str | int]:
+        args: list[str | int] = []
+        for position in self._positions(item):
+            args.extend(("SET", "u1", position, 1))
+        return args
+
+    def add(self, item: str) -> bool:
+        """Adds an item to the filter.
+
+        Returns:
+            bool: False if the filter has not been built yet.
+        """
+        keys = [self.key, self.count_key, self.rebuild_key]
+        return bool(self._add_script(keys=keys, args=self._set_args(item)))
+
+    def clear(self) -> None:
+        """Deletes the filter, so it may contain anything until rebuilt."""
+        self.connection.delete(self.key, self.count_key)
+
+    def _get_args(self, item: str) -> list[str | int]:
+        args: list[str | int] = []
+        for position in self._positions(item):
+            args.extend(("GET", "u1", position))
+        return args
+
+    def might_contain(self, item: str) -> bool:
+        """Checks whether an item may be in the filter.
+
+        Returns:
+            bool: False only if the item is definitely not in the filter. A
+            filter that has not been built yet may contain anything.
+        """
+        pipe = self.connection.pipeline(transaction=False)
+        pipe.exists(self.key)
+        pipe.execute_command("BITFIELD", self.key, *self._get_args(item))
+        exists, bits = pipe.execute()
+        return not exists or all(bits)
+
+    async def amight_contain(self, item: str, connection: AsyncRedis) -> bool:
+        """Async version of ``might_contain`` using the given asyncio client."""
+        async with connection.pipeline(transaction=False) as pipe:
+            pipe.exists(self.key)
+            pipe.execute_command("BITFIELD", self.key, *self._get_args(item))
+            exists, bits = await pipe.execute()
+        return not exists or all(bits)
+
+    def rebuild(self, items: Iterable[str]) -> int:
+        """Rebuilds the filter from scratch and atomically replaces it.
+
+        Args:
+            items: Every item that must be in the filter.
+
+        Returns:
+            int: Number of items added to the filter.
+        """
+        self.connection.delete(self.rebuild_key)
+        self.connection.setbit(self.rebuild_key, self.num_bits - 1, 0)
+
+        count = 0
+        pipe = self.connection.pipeline(transaction=False)
+        for item in items:
+            pipe.execute_command("BITFIELD", self.rebuild_key, *self._set_args(item))
+            count += 1
+            if count % self.REBUILD_CHUNK_SIZE == 0:
+                pipe.execute()
+        pipe.rename(self.rebuild_key, self.key)
+        pipe.set(self.count_key, count)
+        pipe.execute()
+        return count
+
+    def estimated_false_positive_rate(self, count: int) -> float:
+        """Returns the expected false positive rate for ``count`` items."""
+        exponent = -self.num_hashes * count / self.num_bits
+        return (1 - math.exp(exponent)) ** self.num_hashes
+
+    def stats(self) -> dict[str, int | float | bool]:
+        """Returns the size, memory footprint and expected false positive rate."""
+        pipe = self.connection.pipeline(transaction=False)
+        pipe.strlen(self.key)
+        pipe.get(self.count_key)
+        memory_bytes, count = pipe.execute()
+        count = int(count or 0)
+        return {
+            "built": memory_bytes > 0,
+            "capacity": self.capacity,
+            "items": count,
+            "num_bits": self.num_bits,
+            "num_hashes": self.num_hashes,
+            "memory_bytes": memory_bytes,
+            "estimated_false_positive_rate": self.estimated_false_positive_rate(count),
+        }
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+
+class LRUCache:
+    """Thread-safe, size-bounded in-process cache with per-entry expiry.
+
+    Args:
+        max_size: Maximum number of entries kept. When full, the least
+            recently used entry is evicted.
+        timeout: Number of seconds an entry is kept before it expires.
+        on_remove: Called with ``"evicted"`` or ``"expired"`` whenever an
+            entry is dropped for lack of room or because it expired.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        timeout: float,
+        on_remove: Callable[[str], None] | None = None,
+    ) -> None:
+        self.max_size = max_size
+        self.timeout = timeout
+        self.on_remove = on_remove
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns the value stored for key, or default if missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._removed("expired")
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores value for key, evicting the least recently used entries."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._removed("evicted")
+
+    def delete_many(self, keys: list[str]) -> None:
+        """Removes the given keys from the cache."""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes every entry from the cache."""
+        with self._lock:
+            self._data.clear()
+
+    def _removed(self, reason: str) -> None:
+        if self.on_remove is not None:
+            self.on_remove(reason)
@@ -0,0 +1,117 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime
+from functools import cache
+
+from django.db import transaction
+from redis import Redis
+from redis import RedisError
+
+from .redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_WHEEL_KEY = "expiry:wheel"
+
+# Atomically takes the members due at ARGV[1], so concurrent consumers never
+# dispatch the same expiration twice.
+POP_DUE_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1],
+    "WITHSCORES", "LIMIT", 0, ARGV[2])
+for i = 1, #due, 2 do
+    redis.call("ZREM", KEYS[1], due[i])
+end
+return due
+"""
+
+
+class ExpiryWheel:
+    """Schedules object expirations in a Redis sorted set.
+
+    Each ``(kind, id)`` pair is a member scored by its expiry timestamp, so
+    rescheduling an object moves its single entry and finding due entries
+    only reads the entries that are due.
+
+    Args:
+        connection: Redis client with ``decode_responses=True``.
+        key: Key of the sorted set.
+    """
+
+    def __init__(self, connection: Redis, key: str):
+        self.connection = connection
+        self.key = key
+        self.pop_due_script = connection.register_script(POP_DUE_SCRIPT)
+
+    @staticmethod
+    def member(kind: str, object_id: int) -> str:
+        return f"{kind}:{object_id}"
+
+    def schedule(self, entries: Iterable[tuple[str, int, datetime]]) -> None:
+        """Schedules (or reschedules) ``(kind, id, expires_at)`` entries."""
+        mapping = {
+            self.member(kind, object_id): expires_at.timestamp()
+            for kind, object_id, expires_at in entries
+        }
+        if mapping:
+            self.connection.zadd(self.key, mapping)
+
+    def cancel(self, kind: str, *object_ids: int) -> None:
+        """Removes the scheduled expirations of the given objects."""
+        if object_ids:
+            self.connection.zrem(
+                self.key,
+                *[self.member(kind, object_id) for object_id in object_ids],
+            )
+
+    def pop_due(self, now: float, limit: int) -> dict[str, list[tuple[int, float]]]:
+        """Removes and returns up to ``limit`` entries due at ``now``.
+
+        Returns:
+            dict: ``(id, expiry timestamp)`` pairs of the due entries, by kind.
+        """
+        due = self.pop_due_script(keys=[self.key], args=[now, limit])
+        entries = defaultdict(list)
+        for member, score in zip(due[::2], due[1::2], strict=True):
+            kind, object_id = member.rsplit(":", 1)
+            entries[kind].append((int(object_id), float(score)))
+        return dict(entries)
+
+    def restore(self, kind: str, entries: list[tuple[int, float]]) -> None:
+        """Puts entries returned by ``pop_due`` back, e.g. if dispatch failed."""
+        self.connection.zadd(
+            self.key,
+            {self.member(kind, object_id): score for object_id, score in entries},
+        )
+
+    def size(self) -> int:
+        return self.connection.zcard(self.key)
+
+
+@cache
+def get_expiry_wheel() -> ExpiryWheel:
+    """Returns the wheel scheduling link and token expirations."""
+    return ExpiryWheel(get_redis_connection(), EXPIRY_WHEEL_KEY)
+
+
+def schedule_expiration(kind: str, object_id: int, expires_at: datetime | None) -> None:
+    """Schedules (or, without ``expires_at``, cancels) an object's expiration.
+
+    The wheel is updated once the current transaction commits. Redis errors
+    are logged; the periodic database sweeps still expire the object.
+    """
+
+    def update_wheel():
+        try:
+            if expires_at is None:
+                get_expiry_wheel().cancel(kind, object_id)
+            else:
+                get_expiry_wheel().schedule([(kind, object_id, expires_at)])
+        except RedisError:
+            logger.exception(
+                "Failed to schedule the expiration of %s %s",
+                kind,
+                object_id,
+            )
+
+    transaction.on_commit(update_wheel)
@@ -0,0 +1,176 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.http import HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import REGISTRY
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from redis import RedisError
+
+from .tasks import get_queue_depths
+
+logger = logging.getLogger(__name__)
+
+# Bearer token required to read /metrics; empty only allowed with DEBUG on.
+METRICS_TOKEN = getattr(settings, "METRICS_TOKEN", "")
+
+REQUEST_DURATION = Histogram(
+    "sbily_http_request_duration_seconds",
+    "Time spent handling requests, by view.",
+    ["view", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSES = Counter(
+    "sbily_http_responses",
+    "Responses sent, by view and status code.",
+    ["view", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "sbily_http_request_db_queries",
+    "Database queries run per request, by view.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+REQUEST_DB_DURATION = Histogram(
+    "sbily_http_request_db_duration_seconds",
+    "Time spent in database queries per request, by view.",
+    ["view"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+LINK_CACHE_LOOKUPS = Counter(
+    "sbily_link_cache_lookups",
+    "Shortened link cache lookups, by cache tier and result.",
+    ["tier", "result"],
+)
+LINK_FILTER_LOOKUPS = Counter(
+    "sbily_link_filter_lookups",
+    "Shortened link filter answers for missing links, by result.",
+    ["result"],
+)
+LINK_LOCAL_CACHE_REMOVALS = Counter(
+    "sbily_link_local_cache_removals",
+    "Entries dropped from the in-process link cache, by reason.",
+    ["reason"],
+)
+
+
+class QueryStats:
+    """Database execute wrapper counting the queries run and their duration."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def record_request(
+    request: HttpRequest,
+    response: HttpResponse,
+    duration: float,
+    queries: QueryStats | None = None,
+) -> None:
+    """Records the metrics of a handled request."""
+    match = request.resolver_match
+    view = match.view_name if match is not None else "<unresolved>"
+    REQUEST_DURATION.labels(view, request.method).observe(duration)
+    RESPONSES.labels(view, request.method, response.status_code).inc()
+    if queries is not None:
+        REQUEST_DB_QUERIES.labels(view).observe(queries.count)
+        REQUEST_DB_DURATION.labels(view).observe(queries.duration)
+
+
+class QueueDepthCollector:
+    """Reports the depth of the Celery task queues when metrics are read."""
+
+    def collect(self):
+        try:
+            depths = get_queue_depths()
+        except RedisError:
+            logger.exception("Failed to read the task queue depths")
+            return
+        metric = GaugeMetricFamily(
+            "sbily_celery_queue_depth",
+            "Messages waiting in each Celery task queue.",
+            labels=["queue"],
+        )
+        for queue, depth in depths.items():
+            metric.add_metric([queue], depth)
+        yield metric
+
+
+class LinkFilterCollector:
+    """Reports the size of the shortened link filter when metrics are read."""
+
+    def collect(self):
+        from sbily.links.bloom import get_link_filter
+
+        try:
+            stats = get_link_filter().stats()
+        except RedisError:
+            logger.exception("Failed to read the link filter stats")
+            return
+        yield GaugeMetricFamily(
+            "sbily_link_filter_bytes",
+            "Memory used by the shortened link filter.",
+            value=stats["memory_bytes"],
+        )
+        yield GaugeMetricFamily(
+            "sbily_link_filter_items",
+            "Shortened links in the filter.",
+            value=stats["items"],
+        )
+        yield GaugeMetricFamily(
+            "sbily_link_filter_estimated_false_positive_rate",
+            "False positive rate expected from the filter's size and items.",
+            value=stats["estimated_false_positive_rate"],
+        )
+
+
+# Collectors reading state shared in Redis, so every process reports the same.
+redis_registry = CollectorRegistry(auto_describe=False)
+redis_registry.register(QueueDepthCollector())
+redis_registry.register(LinkFilterCollector())
+
+
+def generate_metrics() -> bytes:
+    """Returns the metrics in the Prometheus text format.
+
+    With ``PROMETHEUS_MULTIPROC_DIR`` set (e.g. under gunicorn), the metrics
+    of every worker process are aggregated from that directory.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(redis_registry)
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    if not METRICS_TOKEN:
+        if not settings.DEBUG:
+            logger.warning("Refusing to serve /metrics without a METRICS_TOKEN")
+            return HttpResponseForbidden()
+    elif not constant_time_compare(
+        request.headers.get("Authorization", ""),
+        f"Bearer {METRICS_TOKEN}",
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
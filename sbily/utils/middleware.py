@@ -0,0 +1,44 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.db import connection
+
+from .metrics import QueryStats
+from .metrics import record_request
+
+
+class MetricsMiddleware:
+    """Records the latency, status code and database usage of each request.
+
+    Metrics are labelled with the view name and exported by the ``metrics``
+    view. Database queries are only counted for sync requests, as async views
+    run them on other threads' connections.
+
+    Must be placed first, so the whole stack is timed.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = QueryStats()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        record_request(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        record_request(request, response, time.perf_counter() - start)
+        return response
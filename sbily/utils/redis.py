@@ -0,0 +1,44 @@
+import asyncio
+from functools import cache
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+_async_connections: WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRedis] = (
+    WeakKeyDictionary()
+)
+
+
+def _connection_options() -> dict:
+    return {"ssl_cert_reqs": None} if settings.REDIS_SSL else {}
+
+
+@cache
+def get_redis_connection() -> Redis:
+    """Returns a process-wide Redis client connected to ``REDIS_URL``.
+
+    The underlying connection pool is fork-safe, so the client can be shared
+    by gunicorn and Celery worker processes.
+    """
+    return Redis.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        **_connection_options(),
+    )
+
+
+def get_async_redis_connection() -> AsyncRedis:
+    """Returns an asyncio Redis client connected to ``REDIS_URL``.
+
+    asyncio connections are bound to the event loop that created them, so one
+    client is kept per running loop. Responses are returned as raw bytes so
+    values stored by django-redis can be decoded by its serializer.
+    """
+    loop = asyncio.get_running_loop()
+    connection = _async_connections.get(loop)
+    if connection is None:
+        connection = AsyncRedis.from_url(settings.REDIS_URL, **_connection_options())
+        _async_connections[loop] = connection
+    return connection
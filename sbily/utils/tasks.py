@@ -1,5 +1,40 @@
+import logging
+from functools import cache
 from typing import Any
 
+from celery import Task
+from celery import current_app
+from kombu.transport.redis import PRIORITY_STEPS
+from kombu.transport.redis import Channel
+from redis import RedisError
+from redis.commands.core import Script
+
+from .redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_PREFIX = "tasks:idempotency:"
+
+# Tasks users wait on (e.g. sign in and password reset emails) run on their
+# own queue and workers, so maintenance tasks never delay them.
+QUEUE_INTERACTIVE = "interactive"
+QUEUE_BULK = "bulk"
+TASK_QUEUES = (QUEUE_INTERACTIVE, QUEUE_BULK)
+# Message priorities within a queue, 0 being the highest. The Redis broker
+# groups them into PRIORITY_STEPS.
+PRIORITY_HIGH = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_LOW = 9
+
+# Claims KEYS[1] for ARGV[1] seconds, or counts a suppressed duplicate. The
+# counter keeps the key's expiry, so it is never left without one.
+SUPPRESS_DUPLICATE_SCRIPT = """
+if redis.call("SET", KEYS[1], 0, "NX", "EX", ARGV[1]) then
+    return 0
+end
+return redis.call("INCR", KEYS[1])
+"""
+
 
 def task_response(
     status: str,
@@ -26,12 +61,24 @@ def task_response(
     return response
 
 
-def default_task_params(name: str, **kwargs) -> dict[str, Any]:
+def default_task_params(
+    name: str,
+    queue: str = QUEUE_BULK,
+    priority: int = PRIORITY_DEFAULT,
+    rate_limit: str | None = None,
+    idempotency_window: int | None = None,
+    **kwargs,
+) -> dict[str, Any]:
     """
     Get common Celery task parameters for tasks.
 
     Args:
         name: Name of the task.
+        queue: Queue the task is routed to.
+        priority: Priority of the task's messages in its queue.
+        rate_limit: Maximum rate each worker runs the task at (e.g. "10/s").
+        idempotency_window: Seconds during which ``enqueue_task`` discards
+            dispatches with the same arguments as an earlier one.
         **kwargs: Additional task parameters to override defaults.
 
     Returns:
@@ -40,6 +87,10 @@ def default_task_params(name: str, **kwargs) -> dict[str, Any]:
     base_params = {
         "bind": True,
         "name": name,
+        "queue": queue,
+        "priority": priority,
+        "rate_limit": rate_limit,
+        "idempotency_window": idempotency_window,
         "max_retries": 5,
         "default_retry_delay": 120,
         "autoretry_for": (Exception,),
@@ -48,3 +99,142 @@ def default_task_params(name: str, **kwargs) -> dict[str, Any]:
         "retry_jitter": True,
     }
     return base_params | kwargs
+
+
+def split_pk_range(
+    first: int | None,
+    last: int | None,
+    partitions: int,
+) -> list[tuple[int, int]]:
+    """Splits the primary keys from ``first`` to ``last`` into contiguous ranges.
+
+    Args:
+        first: Smallest primary key, or None if there are no rows.
+        last: Largest primary key, or None if there are no rows.
+        partitions: Maximum number of ranges.
+
+    Returns:
+        List of inclusive ``(start, end)`` ranges covering ``first`` to ``last``.
+    """
+    if first is None or last is None:
+        return []
+    size = -(-(last - first + 1) // max(partitions, 1))
+    return [
+        (start, min(start + size - 1, last)) for start in range(first, last + 1, size)
+    ]
+
+
+def merge_task_responses(message: str, responses: list[dict]) -> dict[str, Any]:
+    """Combines the responses of the partitions of a task into one response.
+
+    Numeric data is summed and flags are true if any partition set them. The
+    status is ``COMPLETED`` only if every partition completed.
+
+    Args:
+        message: Description of the combined task.
+        responses: Responses returned by ``task_response`` in each partition.
+
+    Returns:
+        Dict containing the combined response.
+    """
+    data = {}
+    for response in responses:
+        for key, value in response.get("data", {}).items():
+            if isinstance(value, bool):
+                data[key] = data.get(key, False) or value
+            elif isinstance(value, int | float):
+                data[key] = data.get(key, 0) + value
+    errors = [response["error"] for response in responses if response.get("error")]
+    completed = all(response.get("status") == "COMPLETED" for response in responses)
+    return task_response(
+        "COMPLETED" if completed else "FAILED",
+        message,
+        error="; ".join(errors) or None,
+        partition_count=len(responses),
+        **data,
+    )
+
+
+@cache
+def get_suppress_duplicate_script() -> Script:
+    return get_redis_connection().register_script(SUPPRESS_DUPLICATE_SCRIPT)
+
+
+def suppress_duplicate(name: str, *parts: Any, window: int) -> int:
+    """Collapses runs of a task with the same key within a time window.
+
+    The first call for a key claims it with ``SET NX`` for ``window``
+    seconds. Later calls within the window count themselves as suppressed.
+    Redis errors never suppress a run.
+
+    Args:
+        name: Name of the task.
+        *parts: Values identifying duplicates, e.g. the user ID.
+        window: Seconds during which duplicates are suppressed.
+
+    Returns:
+        int: 0 if this run should go ahead, otherwise the number of runs
+        suppressed in the window so far, including this one.
+    """
+    key = ":".join([IDEMPOTENCY_KEY_PREFIX + name, *map(str, parts)])
+    try:
+        return get_suppress_duplicate_script()(keys=[key], args=[window])
+    except RedisError:
+        logger.exception("Failed to check the idempotency key %s", key)
+        return 0
+
+
+def suppress_duplicate_run(task: Task, *parts: Any, window: int) -> dict | None:
+    """Checks whether a task run duplicates one started within ``window``.
+
+    Retries of a run are never suppressed.
+
+    Args:
+        task: The bound task being run.
+        *parts: Values identifying duplicates, e.g. the user ID.
+        window: Seconds during which duplicates are suppressed.
+
+    Returns:
+        dict | None: The response of the run if it is suppressed, else None.
+    """
+    if task.request.retries:
+        return None
+    suppressed_count = suppress_duplicate(task.name, *parts, window=window)
+    if not suppressed_count:
+        return None
+    return task_response(
+        "SUPPRESSED",
+        f"Suppressed duplicate {task.name} run.",
+        suppressed_count=suppressed_count,
+    )
+
+
+def route_task(name, args, kwargs, options, task=None, **kw) -> dict | None:
+    """Routes a task to the queue and priority declared with its parameters.
+
+    Tasks sent by name (e.g. by beat or the outbox relay) are looked up in
+    the app's registry, so they are routed like ``delay`` calls.
+    """
+    task = task or current_app.tasks.get(name)
+    if task is None or not getattr(task, "queue", None):
+        return None
+    return {"queue": task.queue, "priority": getattr(task, "priority", None)}
+
+
+def get_queue_depths() -> dict[str, int]:
+    """Returns the number of messages waiting in each task queue.
+
+    Messages of every priority are counted; those reserved by workers are not.
+    """
+    keys = [
+        (queue, queue if not step else f"{queue}{Channel.sep}{step}")
+        for queue in TASK_QUEUES
+        for step in PRIORITY_STEPS
+    ]
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for _, key in keys:
+        pipe.llen(key)
+    depths = dict.fromkeys(TASK_QUEUES, 0)
+    for (queue, _), depth in zip(keys, pipe.execute(), strict=True):
+        depths[queue] += depth
+    return depths